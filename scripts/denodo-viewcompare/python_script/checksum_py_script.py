@@ -1,87 +1,1482 @@
-import jaydebeapi
-import random
-import sys
-
-
-JDBC_DRIVER = "com.denodo.vdp.jdbc.Driver"
-JDBC_URL = "jdbc:denodo://localhost:39999/admin"
-USERNAME = "admin"
-PASSWORD = "admin"
-JAR_PATH = "C:/Denodo/DenodoPlatform8.0_custom_3/lib/extensions/jdbc-drivers/vdp-8.0/denodo-vdp-jdbcdriver.jar"
-
-conn_src = jaydebeapi.connect(JDBC_DRIVER, JDBC_URL, [USERNAME, PASSWORD], JAR_PATH)
-conn_tgt = jaydebeapi.connect(JDBC_DRIVER, JDBC_URL, [USERNAME, PASSWORD], JAR_PATH)
-std_input=(sys.argv)
-pk_field_src = std_input[1]
-view_name_src = std_input[2]
-db_name_src = std_input[3]
-pk_field_tgt = std_input[4]
-view_name_tgt = std_input[5]
-db_name_tgt = std_input[6]
-cursor_src = conn_src.cursor()
-cursor_tgt = conn_tgt.cursor()
-
-query_src = f"SELECT hash_inp, pk as pk FROM vdb_testing_tool.source_checksum() WHERE dbname = '{db_name_src}' AND viewname = '{view_name_src}' AND pk_field = '{pk_field_src}'"
-query_tgt = f"SELECT hash_inp, pk as pk FROM vdb_testing_tool.target_checksum() WHERE dbname = '{db_name_tgt}' AND viewname = '{view_name_tgt}' AND pk_field = '{pk_field_tgt}'"
-
-cursor_src.execute("delete from vdb_testing_tool.bv_checksum_comparison;")
-
-cursor_src.execute(query_src)
-cursor_tgt.execute(query_tgt)
-
-
-results_src = cursor_src.fetchall()
-results_tgt = cursor_tgt.fetchall()
-
-
-changed_rows_src = []
-changed_rows_tgt = []
-missing_in_src = []
-missing_in_tgt = []
-new_rows = []
-deleted_rows = []
-mismatch_key = []
-
-src_dict = {row[1]: row[0] for row in results_src}
-tgt_dict = {row[1]: row[0] for row in results_tgt}
-missing_in_tgt = []
-changed_keys = []
-
-for  pk, src_hash in src_dict.items():
-    
-    if pk not in tgt_dict:
-        missing_in_tgt.append(pk)
-        continue
-
-    tgt_hash = tgt_dict[pk]
-    
-    if src_hash != tgt_hash:
-        changed_keys.append(pk)
-    
-missing_in_src = list(set(tgt_dict.keys()) - set(src_dict.keys()))
-
-
-
-
-
-for i in missing_in_src:
-    observation = 'missing in source'
-    sql = "INSERT INTO vdb_testing_tool.bv_checksum_comparison (target_view_name,primary_key, observation ,source_view_name) VALUES (?, ?, ?, ?)"
-    cursor_src.execute(sql, (view_name_tgt, str(i) ,observation, view_name_src))
-for i in missing_in_tgt:
-    observation = 'missing in target'
-    sql = "INSERT INTO vdb_testing_tool.bv_checksum_comparison (target_view_name,primary_key, observation ,source_view_name) VALUES (?, ?, ?, ?)"
-    cursor_src.execute(sql, (view_name_tgt, str(i) ,observation, view_name_src))
-for i in changed_keys:
-    observation = 'mismatch'
-    sql = "INSERT INTO vdb_testing_tool.bv_checksum_comparison (target_view_name,primary_key, observation ,source_view_name) VALUES (?, ?, ?, ?)"
-    cursor_src.execute(sql, (view_name_tgt, str(i) ,observation, view_name_src))
-
-cursor_src.close()
-conn_src.close()
-cursor_tgt.close()
-conn_tgt.close()
-
-
-
-
+import argparse
+import csv
+import gzip
+import hashlib
+import heapq
+import jaydebeapi
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import struct
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from operator import itemgetter
+from statistics import NormalDist
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+JDBC_DRIVER = "com.denodo.vdp.jdbc.Driver"
+JDBC_URL = "jdbc:denodo://localhost:39999/admin"
+USERNAME = "admin"
+PASSWORD = "admin"
+JAR_PATH = "C:/Denodo/DenodoPlatform8.0_custom_3/lib/extensions/jdbc-drivers/vdp-8.0/denodo-vdp-jdbcdriver.jar"
+
+# Source and target VDP servers, only used by the client-side hashing mode (--client-hash), which
+# reads the views directly instead of going through the checksum procedures of the host server
+SOURCE_JDBC_URL = JDBC_URL
+SOURCE_USERNAME = USERNAME
+SOURCE_PASSWORD = PASSWORD
+TARGET_JDBC_URL = JDBC_URL
+TARGET_USERNAME = USERNAME
+TARGET_PASSWORD = PASSWORD
+
+# Comparison mode:
+#   "memory"    - fetch both checksum sets completely and diff them as dictionaries
+#   "streaming" - fetch both sides ordered by pk in batches and diff them as a sorted merge,
+#                 so memory stays constant regardless of the number of rows
+#   "compact"   - like "memory", but each side is packed into sorted NumPy arrays (pk bytes and a
+#                 16-byte digest of the hash) and diffed with vectorized lookups; requires NumPy
+#   "external"  - sort each side in runs of EXTERNAL_RUN_SIZE pairs spilled to temporary files and
+#                 diff the k-way merge of the runs, so memory is bounded for any view size
+#   "hierarchical" - compare per pk-range rollups computed in VQL first and only fetch the
+#                 row-level checksums of the ranges whose rollups differ (numeric pks only)
+COMPARE_MODE = "memory"
+FETCH_BATCH_SIZE = 10000
+# Number of result rows sent per executemany call; each batch is committed as one transaction
+INSERT_BATCH_SIZE = 1000
+# Fetched batches each checksum scan may buffer ahead of the comparison
+QUEUE_SIZE = 4
+# Number of pk ranges compared independently (1 disables partitioning) and the worker pool running them.
+# Partitioning needs numeric pks and a known key range (--key-range LOW HIGH).
+PARTITIONS = 1
+PARTITION_WORKERS = 4
+# View pairs of a --manifest batch run compared at the same time
+BATCH_WORKERS = 4
+# File the JSON run report is written to (None only prints it), and whether a summary row is also
+# inserted into vdb_testing_tool.bv_checksum_run_stats
+RUN_REPORT = None
+WRITE_RUN_STATS = False
+# Pairs sorted in memory per spilled run in the external mode, and where the runs are written
+# (None uses the system temporary directory)
+EXTERNAL_RUN_SIZE = 1000000
+SPILL_DIR = None
+# Width of the pk ranges rolled up by the hierarchical mode (at most ROLLUP_MAX_BUCKET_SIZE), and the
+# number of leading characters of each row's hash of its pk and row hash summed into the digest of
+# one range. The digest must not depend on the order Denodo returns the rows in, or every range would
+# look changed; at most 17 ** 10 per row keeps the sum of the largest bucket in a long.
+ROLLUP_BUCKET_SIZE = 100000
+ROLLUP_MAX_BUCKET_SIZE = 1000000
+ROLLUP_DIGEST_LENGTH = 10
+# Compute the row digests in this script instead of the checksum procedures, and the number of
+# processes hashing the fetched rows
+CLIENT_HASH = False
+HASH_WORKERS = os.cpu_count() or 1
+# Second phase fetching the mismatching keys from both views (in IN lists of DRILLDOWN_CHUNK_SIZE
+# keys, at most DRILLDOWN_MAX_KEYS per comparison) to record which columns differ, with values
+# truncated to DRILLDOWN_VALUE_LENGTH characters. Reads the views from the SOURCE_*/TARGET_* servers.
+DRILLDOWN = False
+DRILLDOWN_CHUNK_SIZE = 500
+DRILLDOWN_MAX_KEYS = 10000
+DRILLDOWN_VALUE_LENGTH = 234
+# Quick check: row counts plus the checksums of the keys whose SAMPLE_KEY is a multiple of
+# SAMPLE_MODULUS, with a CONFIDENCE interval for the share of differing rows. {pk} is replaced by the
+# pk column; use a hashing expression instead for keys that are not numeric or not evenly spread.
+SAMPLE_MODULUS = 1000
+SAMPLE_KEY = "CAST({pk} AS long)"
+CONFIDENCE = 0.95
+# Cells of the invertible Bloom lookup table summarizing a view for --summarize / --iblt. A summary
+# can list up to about two thirds as many differing (pk, hash) pairs as it has cells, whatever the
+# number of rows; a mismatching key counts as two pairs.
+IBLT_CELLS = 30000
+IBLT_HASHES = 3
+# Results of a run with a run id are stored under it instead of replacing the results of every earlier
+# run, and each view pair / pk range is checkpointed in bv_checksum_run_progress once its results are
+# committed. A run restarted with the same run id and --resume skips the checkpointed ranges.
+RUN_ID = None
+# Directory holding the per-view checksum snapshots of the incremental compare (--incremental).
+# Snapshots store numeric pks and hashes of up to SNAPSHOT_HASH_WIDTH bytes as fixed-width records.
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_HASH_WIDTH = 64
+
+MISSING_IN_SOURCE = 'missing in source'
+MISSING_IN_TARGET = 'missing in target'
+MISMATCH = 'mismatch'
+
+RESULT_COLUMNS = ("target_view_name", "primary_key", "observation", "source_view_name")
+COLUMN_RESULT_COLUMNS = ("source_view_name", "target_view_name", "primary_key", "column_name", "source_value", "target_value")
+RUN_COLUMNS = ("run_id", "source_db_name", "target_db_name", "key_range")
+PROGRESS_SQL = ("INSERT INTO vdb_testing_tool.bv_checksum_run_progress (run_id, source_view_name, target_view_name, source_db_name, "
+                "target_db_name, key_range, differences, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+RUN_STATS_SQL = ("INSERT INTO vdb_testing_tool.bv_checksum_run_stats (source_view_name, target_view_name, run_started, compare_mode, "
+                 "total_seconds, source_scan_seconds, target_scan_seconds, build_seconds, diff_seconds, insert_seconds, "
+                 "rows_fetched, bytes_fetched, rows_written, insert_rows_per_second, report) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+
+class RunStats:
+    """Thread-safe accumulator of per-phase wall time and row/byte counters for the run report.
+    Phases running in parallel threads (e.g. the source and target scans) are summed per phase."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self, writers, **details):
+        """Build the run report, with the insert time and rows of all the result writers together."""
+        write_time = sum(writer.write_time for writer in writers)
+        rows_written = sum(writer.rows_written for writer in writers)
+        with self.lock:
+            report = dict(details)
+            report["started_at"] = self.started.isoformat(sep=" ", timespec="seconds")
+            report["total_seconds"] = round(time.perf_counter() - self.start, 3)
+            report["phases"] = {name: round(seconds, 3) for name, seconds in self.phases.items()}
+            report["phases"]["insert"] = round(write_time, 3)
+            report["counters"] = dict(self.counters)
+            report["counters"]["rows_written"] = rows_written
+            report["insert_rows_per_second"] = round(rows_written / write_time, 1) if write_time else 0.0
+        return report
+
+
+STATS = RunStats()
+
+
+SERVERS = {
+    "host": (JDBC_URL, USERNAME, PASSWORD),
+    "source": (SOURCE_JDBC_URL, SOURCE_USERNAME, SOURCE_PASSWORD),
+    "target": (TARGET_JDBC_URL, TARGET_USERNAME, TARGET_PASSWORD),
+}
+
+
+def connect(server="host"):
+    url, username, password = SERVERS[server]
+    return jaydebeapi.connect(JDBC_DRIVER, url, [username, password], JAR_PATH)
+
+
+def checksum_source(side, db_name, view_name, pk_field):
+    return f"FROM vdb_testing_tool.{side}_checksum() WHERE dbname = '{db_name}' AND viewname = '{view_name}' AND pk_field = '{pk_field}'"
+
+
+def rollup_digest(column="row_digest", length=ROLLUP_DIGEST_LENGTH):
+    """Build the VQL aggregate digesting the hashes of a bucket independently of the row order: the
+    sum of the number each row's hash spells with the positions of its first characters among the
+    hex digits."""
+    digits = " + ".join(f"INSTR('0123456789abcdef', SUBSTR(LOWER({column}), {i + 1}, 1)) * {17 ** (length - 1 - i)}"
+                        for i in range(length))
+    return f"SUM({digits})"
+
+
+def rollup_query(side, db_name, view_name, pk_field, bucket_size=ROLLUP_BUCKET_SIZE):
+    """Build the query returning (bucket, row count, digest) per pk range of bucket_size keys."""
+    return (f"SELECT bucket, COUNT(*) AS row_count, {rollup_digest()} AS digest FROM ("
+            f"SELECT FLOOR(CAST(pk AS long) / {bucket_size}) AS bucket, "
+            # Hashing the pk with the row hash keeps rows that swap their hashes from cancelling out
+            f"HASH(CONCAT(pk, '|', hash_inp)) AS row_digest {checksum_source(side, db_name, view_name, pk_field)}"
+            f") GROUP BY bucket")
+
+
+def sample_condition(pk, sample):
+    return f"MOD({SAMPLE_KEY.format(pk=pk)}, {sample}) = 0"
+
+
+def bucket_condition(pk, buckets):
+    """Restrict a query to the keys of the (bucket size, bucket numbers) of the hierarchical mode."""
+    bucket_size, numbers = buckets
+    return f"FLOOR(CAST({pk} AS long) / {bucket_size}) IN ({', '.join(str(number) for number in numbers)})"
+
+
+def raw_query(db_name, view_name, pk_field, ordered=False, key_range=None, sample=None, buckets=None):
+    """Build the query reading every column of a view directly, for the client-side hashing mode."""
+    query = f"SELECT * FROM {db_name}.{view_name}"
+    conditions = [] if sample is None else [sample_condition(pk_field, sample)]
+    if buckets is not None:
+        conditions.append(bucket_condition(pk_field, buckets))
+    if key_range is not None:
+        low, high = key_range
+        if low is not None:
+            conditions.append(f"{pk_field} >= {low}")
+        if high is not None:
+            conditions.append(f"{pk_field} <= {high}")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if ordered:
+        query += f" ORDER BY {pk_field}"
+    return query
+
+
+def checksum_query(side, db_name, view_name, pk_field, ordered=False, key_range=None, numeric=False, sample=None,
+                   buckets=None):
+    """Build the query over vdb_testing_tool.source_checksum() / target_checksum(), optionally
+    restricted to an inclusive (low, high) pk range where None leaves that end open, to the
+    1-in-sample keys of the quick check or to some buckets of the hierarchical mode. Numeric
+    queries order by the pk value instead of its text."""
+    query = f"SELECT hash_inp, pk as pk {checksum_source(side, db_name, view_name, pk_field)}"
+    if sample is not None:
+        query += f" AND {sample_condition('pk', sample)}"
+    if buckets is not None:
+        query += f" AND {bucket_condition('pk', buckets)}"
+    if key_range is not None:
+        low, high = key_range
+        if low is not None:
+            query += f" AND CAST(pk AS long) >= {low}"
+        if high is not None:
+            query += f" AND CAST(pk AS long) <= {high}"
+    if ordered:
+        query += " ORDER BY CAST(pk AS long)" if numeric else " ORDER BY pk"
+    return query
+
+
+_END_OF_SCAN = object()
+
+
+def approximate_bytes(rows):
+    """Estimate the size of a fetched batch as text from its first row, so that counting costs
+    one row per batch instead of converting every value."""
+    return len(rows) * sum(len(str(value)) for value in rows[0]) if rows else 0
+
+
+class ChecksumScan(threading.Thread):
+    """Runs one checksum query on its own connection in a worker thread and hands the fetched
+    batches to the comparison through a bounded queue. Iterating the scan yields (pk, hash) pairs."""
+
+    def __init__(self, cursor, query, batch_size=FETCH_BATCH_SIZE, queue_size=QUEUE_SIZE, side="source"):
+        super().__init__(daemon=True)
+        self.cursor = cursor
+        self.query = query
+        self.side = side
+        self.batch_size = batch_size
+        self.batches = queue.Queue(maxsize=queue_size)
+
+    def run(self):
+        try:
+            with STATS.phase(f"{self.side}_scan"):
+                self.cursor.execute(self.query)
+            while True:
+                with STATS.phase(f"{self.side}_scan"):
+                    rows = self.cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                STATS.count(f"{self.side}_rows_fetched", len(rows))
+                STATS.count("bytes_fetched", approximate_bytes(rows))
+                self.batches.put(rows)
+            self.batches.put(_END_OF_SCAN)
+        except Exception as e:
+            self.batches.put(e)
+
+    def __iter__(self):
+        while True:
+            batch = self.batches.get()
+            if batch is _END_OF_SCAN:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            if isinstance(batch, Future):
+                batch = batch.result()
+            for row in batch:
+                yield row[1], row[0]
+
+
+_PLAIN_TYPES = (str, int, float, Decimal, bytes)
+
+
+def normalize_value(value):
+    """Render a column value as text that is stable across servers and driver versions."""
+    if value is None:
+        return "\0"
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, Decimal):
+        return format(value.normalize(), "f")
+    if isinstance(value, bytes):
+        return value.hex()
+    return str(value)
+
+
+def digest_rows(rows, pk_index, column_order):
+    """Return (digest, pk) for each raw row: a blake2b digest of the normalized values of the
+    columns in column_order. Runs in the hashing processes."""
+    digests = []
+    for row in rows:
+        payload = "\x1f".join(normalize_value(row[i]) for i in column_order)
+        digests.append((hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest(), row[pk_index]))
+    return digests
+
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+
+def hash_pool(workers=HASH_WORKERS):
+    """Return the process pool shared by every client-side hashing scan, starting it on first use.
+    Processes are spawned, not forked, so they never inherit the JVM of this process."""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _hash_pool
+
+
+class RowDigestScan(ChecksumScan):
+    """Reads the raw rows of a view and computes the row digests in the hashing process pool instead
+    of the checksum procedures. Iterating the scan yields the same (pk, hash) pairs as ChecksumScan."""
+
+    def __init__(self, cursor, query, pk_field, workers=HASH_WORKERS, batch_size=FETCH_BATCH_SIZE,
+                 queue_size=QUEUE_SIZE, side="source"):
+        # Queued batches are hashing futures, so let enough of them be in flight to keep the pool busy
+        super().__init__(cursor, query, batch_size, max(queue_size, workers), side)
+        self.pk_field = pk_field
+        self.workers = workers
+
+    def run(self):
+        try:
+            with STATS.phase(f"{self.side}_scan"):
+                self.cursor.execute(self.query)
+            columns = [column[0].lower() for column in self.cursor.description]
+            if self.pk_field.lower() not in columns:
+                raise ValueError(f"{self.side.capitalize()} view has no column {self.pk_field}")
+            pk_index = columns.index(self.pk_field.lower())
+            # Hash the columns in name order so both sides agree even if the column order differs
+            column_order = sorted(range(len(columns)), key=columns.__getitem__)
+            while True:
+                with STATS.phase(f"{self.side}_scan"):
+                    rows = self.cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                # Driver objects (e.g. Java strings) cannot be sent to other processes
+                rows = [tuple(value if value is None or isinstance(value, _PLAIN_TYPES) else str(value) for value in row)
+                        for row in rows]
+                STATS.count(f"{self.side}_rows_fetched", len(rows))
+                STATS.count("bytes_fetched", approximate_bytes(rows))
+                self.batches.put(hash_pool(self.workers).submit(digest_rows, rows, pk_index, column_order))
+            self.batches.put(_END_OF_SCAN)
+        except Exception as e:
+            self.batches.put(e)
+
+
+def check_sorted(pairs, side):
+    """Pass (pk, hash) pairs through, failing as soon as the pks are not strictly ascending."""
+    previous = None
+    for pair in pairs:
+        if previous is not None and not previous < pair[0]:
+            raise ValueError(f"{side} checksum rows are not strictly ordered by pk ({previous!r} followed by {pair[0]!r}). "
+                             "The streaming mode needs unique pks sorted the same way by Denodo and Python.")
+        previous = pair[0]
+        yield pair
+
+
+def diff_in_memory(src_dict, tgt_dict):
+    """Diff two {pk: hash} dictionaries. Yields (pk, observation)."""
+    missing_in_tgt = []
+    changed_keys = []
+    for pk, src_hash in src_dict.items():
+        if pk not in tgt_dict:
+            missing_in_tgt.append(pk)
+            continue
+        if src_hash != tgt_dict[pk]:
+            changed_keys.append(pk)
+    missing_in_src = list(set(tgt_dict.keys()) - set(src_dict.keys()))
+
+    for pk in missing_in_src:
+        yield pk, MISSING_IN_SOURCE
+    for pk in missing_in_tgt:
+        yield pk, MISSING_IN_TARGET
+    for pk in changed_keys:
+        yield pk, MISMATCH
+
+
+class CompactChecksums:
+    """The (pk, hash) pairs of one view packed into NumPy arrays sorted by pk: each pk as fixed-width
+    bytes and each hash as a 16-byte blake2b digest, instead of two Python strings in a dict."""
+
+    CHUNK_SIZE = 100000
+
+    def __init__(self, pairs):
+        key_chunks = []
+        digest_chunks = []
+        pairs = iter(pairs)
+        for chunk in iter(lambda: list(islice(pairs, self.CHUNK_SIZE)), []):
+            key_chunks.append(np.array([str(pk).encode("utf-8") for pk, _ in chunk], dtype=np.bytes_))
+            digest_chunks.append(np.array([hashlib.blake2b(str(row_hash).encode("utf-8"), digest_size=16).digest()
+                                           for _, row_hash in chunk], dtype="S16"))
+        if not key_chunks:
+            key_chunks, digest_chunks = [np.array([], dtype="S1")], [np.array([], dtype="S16")]
+
+        keys = np.concatenate(key_chunks)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.digests = np.concatenate(digest_chunks)[order]
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def _lookup(keys, sorted_keys):
+    """Return (found mask, positions) of keys within the sorted array sorted_keys."""
+    positions = np.searchsorted(sorted_keys, keys)
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool), positions
+    positions = np.minimum(positions, len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys, positions
+
+
+def diff_compact(src, tgt):
+    """Diff two CompactChecksums with vectorized searchsorted lookups. Yields (pk, observation)."""
+    found_in_tgt, positions = _lookup(src.keys, tgt.keys)
+    found_in_src, _ = _lookup(tgt.keys, src.keys)
+    mismatch = found_in_tgt.copy()
+    mismatch[found_in_tgt] = src.digests[found_in_tgt] != tgt.digests[positions[found_in_tgt]]
+
+    for pk in tgt.keys[~found_in_src]:
+        yield pk.decode("utf-8"), MISSING_IN_SOURCE
+    for pk in src.keys[~found_in_tgt]:
+        yield pk.decode("utf-8"), MISSING_IN_TARGET
+    for pk in src.keys[mismatch]:
+        yield pk.decode("utf-8"), MISMATCH
+
+
+def diff_sorted(src_pairs, tgt_pairs):
+    """Walk two pk-sorted (pk, hash) streams together as a merge join. Yields (pk, observation)
+    as soon as each difference is found, holding only the current row of each side."""
+    src_iter = iter(src_pairs)
+    tgt_iter = iter(tgt_pairs)
+    src = next(src_iter, None)
+    tgt = next(tgt_iter, None)
+
+    while src is not None and tgt is not None:
+        if src[0] == tgt[0]:
+            if src[1] != tgt[1]:
+                yield src[0], MISMATCH
+            src = next(src_iter, None)
+            tgt = next(tgt_iter, None)
+        elif src[0] < tgt[0]:
+            yield src[0], MISSING_IN_TARGET
+            src = next(src_iter, None)
+        else:
+            yield tgt[0], MISSING_IN_SOURCE
+            tgt = next(tgt_iter, None)
+
+    while src is not None:
+        yield src[0], MISSING_IN_TARGET
+        src = next(src_iter, None)
+    while tgt is not None:
+        yield tgt[0], MISSING_IN_SOURCE
+        tgt = next(tgt_iter, None)
+
+
+def spill_sorted_runs(pairs, run_size, directory):
+    """Sort pairs in chunks of run_size by pk and write each chunk to its own file in directory.
+    Returns the paths of the runs."""
+    paths = []
+    pairs = iter(pairs)
+    for chunk in iter(lambda: list(islice(pairs, run_size)), []):
+        chunk.sort(key=itemgetter(0))
+        fd, path = tempfile.mkstemp(suffix=".run", dir=directory)
+        with os.fdopen(fd, "wb") as f:
+            for start in range(0, len(chunk), FETCH_BATCH_SIZE):
+                pickle.dump(chunk[start:start + FETCH_BATCH_SIZE], f, protocol=pickle.HIGHEST_PROTOCOL)
+        paths.append(path)
+    return paths
+
+
+def read_run(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                batch = pickle.load(f)
+            except EOFError:
+                return
+            yield from batch
+
+
+def diff_external(scan_src, scan_tgt, args):
+    """Spill both sides to sorted runs on disk and diff the k-way merges of the runs. Yields (pk, observation)."""
+    with tempfile.TemporaryDirectory(prefix="viewcompare-", dir=args.spill_dir) as directory:
+        with STATS.phase("build"), ThreadPoolExecutor(max_workers=2) as pool:
+            runs_src = pool.submit(spill_sorted_runs, scan_src, args.run_size, directory)
+            runs_tgt = pool.submit(spill_sorted_runs, scan_tgt, args.run_size, directory)
+            runs_src, runs_tgt = runs_src.result(), runs_tgt.result()
+        print(f"Spilled {len(runs_src)} source and {len(runs_tgt)} target runs to {directory}")
+
+        merged_src = heapq.merge(*(read_run(path) for path in runs_src), key=itemgetter(0))
+        merged_tgt = heapq.merge(*(read_run(path) for path in runs_tgt), key=itemgetter(0))
+        yield from diff_sorted(check_sorted(merged_src, "Source"), check_sorted(merged_tgt, "Target"))
+
+
+class InvertibleBloomTable:
+    """Invertible Bloom lookup table of (pk, hash) pairs. After subtracting the table of the other
+    view only the pairs present on one side are left, and they can be listed back as long as there
+    are fewer of them than about two thirds of the cells, however many rows were summarized."""
+
+    def __init__(self, cells=IBLT_CELLS):
+        # Each hash function has its own slice of cells, so a pair never lands twice in the same cell
+        self.size = -(-cells // IBLT_HASHES)
+        cells = self.size * IBLT_HASHES
+        self.counts = [0] * cells
+        self.keys = [0] * cells
+        self.fingerprints = [0] * cells
+        self.checks = [0] * cells
+        self.rows = 0
+
+    def _cells(self, fingerprint):
+        """Return the cells of a pair and the check value telling a cell holding only that pair."""
+        digest = hashlib.blake2b(fingerprint.to_bytes(8, "little"), digest_size=4 * IBLT_HASHES + 8).digest()
+        cells = [i * self.size + int.from_bytes(digest[4 * i:4 * i + 4], "little") % self.size for i in range(IBLT_HASHES)]
+        return cells, int.from_bytes(digest[-8:], "little")
+
+    def _update(self, sign, key, fingerprint):
+        cells, check = self._cells(fingerprint)
+        for cell in cells:
+            self.counts[cell] += sign
+            self.keys[cell] ^= key
+            self.fingerprints[cell] ^= fingerprint
+            self.checks[cell] ^= check
+
+    def add(self, pk, row_hash):
+        pk = str(pk).encode()
+        row_hash = row_hash if isinstance(row_hash, bytes) else str(row_hash).encode()
+        fingerprint = int.from_bytes(hashlib.blake2b(pk + b"\0" + row_hash, digest_size=8).digest(), "little")
+        # The leading 1 byte keeps the leading zero bytes of the pk when the key is turned back into bytes
+        self._update(1, int.from_bytes(b"\1" + pk, "big"), fingerprint)
+        self.rows += 1
+
+    def subtract(self, other):
+        if len(other.counts) != len(self.counts):
+            raise ValueError(f"Cannot subtract a table of {len(other.counts)} cells from one of {len(self.counts)} cells")
+        for cell in range(len(self.counts)):
+            self.counts[cell] -= other.counts[cell]
+            self.keys[cell] ^= other.keys[cell]
+            self.fingerprints[cell] ^= other.fingerprints[cell]
+            self.checks[cell] ^= other.checks[cell]
+
+    def _pure(self, cell):
+        return self.counts[cell] in (1, -1) and self._cells(self.fingerprints[cell])[1] == self.checks[cell]
+
+    def peel(self):
+        """Empty a subtracted table, returning (pks only in this table, pks only in the subtracted one).
+        Raises ValueError if more pairs differ than the table can list."""
+        only_self, only_other = [], []
+        pending = [cell for cell in range(len(self.counts)) if self._pure(cell)]
+        while pending:
+            cell = pending.pop()
+            if not self._pure(cell):
+                continue
+            sign, key, fingerprint = self.counts[cell], self.keys[cell], self.fingerprints[cell]
+            (only_self if sign == 1 else only_other).append(key.to_bytes((key.bit_length() + 7) // 8, "big")[1:].decode())
+            self._update(-sign, key, fingerprint)
+            pending.extend(self._cells(fingerprint)[0])
+        if any(self.counts) or any(self.fingerprints):
+            raise ValueError(f"More pairs differ than a summary of {len(self.counts)} cells can list; "
+                             f"summarize again with a larger --iblt-cells or run a full comparison")
+        return only_self, only_other
+
+    def save(self, path, **details):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump({**details, "rows": self.rows, "cells": len(self.counts), "counts": self.counts,
+                       "keys": [format(key, "x") for key in self.keys], "fingerprints": self.fingerprints,
+                       "checks": self.checks}, f)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved table. Returns (table, the details saved with it)."""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            details = json.load(f)
+        table = cls(details.pop("cells"))
+        table.rows = details.pop("rows")
+        table.counts = details.pop("counts")
+        table.keys = [int(key, 16) for key in details.pop("keys")]
+        table.fingerprints = details.pop("fingerprints")
+        table.checks = details.pop("checks")
+        return table, details
+
+
+def view_of(args, side):
+    """Return (db name, view name, pk field) of the source or target view in args."""
+    suffix = "src" if side == "source" else "tgt"
+    return tuple(getattr(args, f"{field}_{suffix}") for field in ("db_name", "view_name", "pk_field"))
+
+
+def make_scan(cursor, args, side, ordered=False, key_range=None, sample=None, buckets=None):
+    """Create the (not yet started) scan of the source or target side of the comparison in args."""
+    db_name, view_name, pk_field = view_of(args, side)
+    if args.client_hash:
+        query = raw_query(db_name, view_name, pk_field, ordered, key_range, sample, buckets)
+        return RowDigestScan(cursor, query, pk_field, args.hash_workers, args.batch_size, args.queue_size, side)
+    query = checksum_query(side, db_name, view_name, pk_field, ordered, key_range, sample=sample, buckets=buckets)
+    return ChecksumScan(cursor, query, args.batch_size, args.queue_size, side)
+
+
+def compare(cursor_src, cursor_tgt, args, key_range=None, buckets=None):
+    """Run both checksum queries at the same time and yield (pk, observation) for every difference found."""
+    streaming = args.mode == "streaming"
+    scan_src = make_scan(cursor_src, args, "source", streaming, key_range, buckets=buckets)
+    scan_tgt = make_scan(cursor_tgt, args, "target", streaming, key_range, buckets=buckets)
+    scan_src.start()
+    scan_tgt.start()
+
+    if streaming:
+        return diff_sorted(check_sorted(scan_src, "Source"), check_sorted(scan_tgt, "Target"))
+    if args.mode == "external":
+        return diff_external(scan_src, scan_tgt, args)
+
+    # Drain both queues concurrently so neither scan stalls on a full queue while the other side loads
+    compact = args.mode == "compact"
+    with STATS.phase("build"), ThreadPoolExecutor(max_workers=2) as pool:
+        src_store = pool.submit(CompactChecksums if compact else dict, scan_src)
+        tgt_store = pool.submit(CompactChecksums if compact else dict, scan_tgt)
+        if compact:
+            return diff_compact(src_store.result(), tgt_store.result())
+        return diff_in_memory(src_store.result(), tgt_store.result())
+
+
+def fetch_rollups(cursor, query):
+    """Run a rollup query and return {bucket: (row count, digest)}."""
+    cursor.execute(query)
+    return {int(bucket): (int(row_count), digest) for bucket, row_count, digest in cursor.fetchall()}
+
+
+def compare_hierarchical(cursor_src, cursor_tgt, args):
+    """Compare per-bucket rollups of both views and drill down to row level, in one query per side,
+    only in the buckets whose row count or digest differ. Yields (pk, observation)."""
+    query_src = rollup_query("source", args.db_name_src, args.view_name_src, args.pk_field_src, args.bucket_size)
+    query_tgt = rollup_query("target", args.db_name_tgt, args.view_name_tgt, args.pk_field_tgt, args.bucket_size)
+    with STATS.phase("build"), ThreadPoolExecutor(max_workers=2) as pool:
+        rollups_src = pool.submit(fetch_rollups, cursor_src, query_src)
+        rollups_tgt = pool.submit(fetch_rollups, cursor_tgt, query_tgt)
+        rollups_src, rollups_tgt = rollups_src.result(), rollups_tgt.result()
+
+    buckets = rollups_src.keys() | rollups_tgt.keys()
+    changed = sorted(bucket for bucket in buckets if rollups_src.get(bucket) != rollups_tgt.get(bucket))
+    print(f"{len(changed)} of {len(buckets)} buckets differ")
+
+    if changed:
+        yield from compare(cursor_src, cursor_tgt, args, buckets=(args.bucket_size, changed))
+
+
+def build_table(scan, cells):
+    table = InvertibleBloomTable(cells)
+    scan.start()
+    with STATS.phase("build"):
+        for pk, row_hash in scan:
+            table.add(pk, row_hash)
+    return table
+
+
+def compare_iblt(cursor_tgt, args):
+    """Compare the target view with the source summary written by --summarize, reading only the
+    target. Yields (pk, observation)."""
+    source, details = InvertibleBloomTable.load(args.iblt)
+    if details["client_hash"] != args.client_hash:
+        raise ValueError(f"{args.iblt} was summarized {'with' if details['client_hash'] else 'without'} --client-hash")
+    target = build_table(make_scan(cursor_tgt, args, "target"), len(source.counts))
+    source.subtract(target)
+    only_source, only_target = source.peel()
+    print(f"{source.rows} source rows ({details['view_name']}), {target.rows} target rows, "
+          f"{len(only_source) + len(only_target)} differing pairs")
+
+    only_target = set(only_target)
+    for pk in only_source:
+        if pk in only_target:
+            only_target.discard(pk)
+            yield pk, MISMATCH
+        else:
+            yield pk, MISSING_IN_TARGET
+    for pk in only_target:
+        yield pk, MISSING_IN_SOURCE
+
+
+def summarize(args, pool):
+    """Save the invertible Bloom table of the source view to args.summarize, to be shipped to the
+    target's site and compared there with --iblt."""
+    conn = pool.acquire("source" if args.client_hash else "host")
+    try:
+        cursor = conn.cursor()
+        table = build_table(make_scan(cursor, args, "source"), args.iblt_cells)
+        cursor.close()
+    except Exception:
+        pool.discard(conn)
+        raise
+    pool.release(conn)
+    table.save(args.summarize, view_name=f"{args.db_name_src}.{args.view_name_src}", client_hash=args.client_hash)
+    print(f"Summarized {table.rows} rows into {len(table.counts)} cells ({os.path.getsize(args.summarize)} bytes) in {args.summarize}")
+
+
+def count_rows(cursor, db_name, view_name, condition=None):
+    cursor.execute(f"SELECT COUNT(*) FROM {db_name}.{view_name}" + ("" if condition is None else f" WHERE {condition}"))
+    rows = int(cursor.fetchall()[0][0])
+    cursor.close()
+    return rows
+
+
+def wilson_interval(hits, trials, confidence=CONFIDENCE):
+    """Wilson score interval of a proportion, which stays meaningful when no or few hits are seen."""
+    if not trials:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = hits / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def quick_check(args, pool):
+    """Compare the row counts of both views and the checksums of the 1-in-sample_modulus keys, and
+    estimate the share of differing rows with its confidence interval. Returns the check report."""
+    start = time.perf_counter()
+    conn_src, conn_tgt = pool.acquire("source"), pool.acquire("target")
+    try:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            rows_src = executor.submit(count_rows, conn_src.cursor(), *view_of(args, "source")[:2])
+            rows_tgt = executor.submit(count_rows, conn_tgt.cursor(), *view_of(args, "target")[:2])
+            rows_src, rows_tgt = rows_src.result(), rows_tgt.result()
+    except Exception:
+        pool.discard(conn_src)
+        pool.discard(conn_tgt)
+        raise
+    pool.release(conn_src)
+    pool.release(conn_tgt)
+
+    if args.client_hash:
+        conn_src, conn_tgt = pool.acquire("source"), pool.acquire("target")
+    else:
+        conn_src, conn_tgt = pool.acquire(), pool.acquire()
+    try:
+        cursor_src, cursor_tgt = conn_src.cursor(), conn_tgt.cursor()
+        scan_src = make_scan(cursor_src, args, "source", sample=args.sample_modulus)
+        scan_tgt = make_scan(cursor_tgt, args, "target", sample=args.sample_modulus)
+        scan_src.start()
+        scan_tgt.start()
+        with STATS.phase("build"), ThreadPoolExecutor(max_workers=2) as executor:
+            sample_src = executor.submit(dict, scan_src)
+            sample_tgt = executor.submit(dict, scan_tgt)
+            sample_src, sample_tgt = sample_src.result(), sample_tgt.result()
+        cursor_src.close()
+        cursor_tgt.close()
+    except Exception:
+        pool.discard(conn_src)
+        pool.discard(conn_tgt)
+        raise
+    pool.release(conn_src)
+    pool.release(conn_tgt)
+
+    observations = {MISSING_IN_SOURCE: 0, MISSING_IN_TARGET: 0, MISMATCH: 0}
+    for _, observation in diff_in_memory(sample_src, sample_tgt):
+        observations[observation] += 1
+    differing = sum(observations.values())
+    sampled = len(sample_src.keys() | sample_tgt.keys())
+    low, high = wilson_interval(differing, sampled, args.confidence)
+    rate = differing / sampled if sampled else 0.0
+    rows = max(rows_src, rows_tgt)
+    print(f"Row counts: {rows_src} source, {rows_tgt} target. {differing} of {sampled} sampled keys differ: "
+          f"estimated mismatch rate {rate:.4%} ({args.confidence:.0%} confidence {low:.4%} - {high:.4%})")
+    return {
+        "source_view_name": ".".join(view_of(args, "source")[:2]),
+        "target_view_name": ".".join(view_of(args, "target")[:2]),
+        "source_rows": rows_src,
+        "target_rows": rows_tgt,
+        "row_counts_match": rows_src == rows_tgt,
+        "sample_modulus": args.sample_modulus,
+        "sampled_keys": sampled,
+        "sample_differences": observations,
+        "estimated_mismatch_rate": round(rate, 6),
+        "confidence": args.confidence,
+        "mismatch_rate_bounds": [round(low, 6), round(high, 6)],
+        "estimated_differing_rows": [math.floor(low * rows), round(rate * rows), math.ceil(high * rows)],
+        "total_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+SNAPSHOT_MAGIC = b"VCSNAP01"
+SNAPSHOT_RECORD = struct.Struct(f"<q{SNAPSHOT_HASH_WIDTH}s")
+
+
+def write_snapshot(path, pairs):
+    """Persist pk-sorted (pk, hash) pairs as fixed-width binary records. The file is written next
+    to its final location and swapped in only once complete."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        for pk, row_hash in pairs:
+            encoded = row_hash.encode("utf-8")
+            if len(encoded) > SNAPSHOT_HASH_WIDTH:
+                raise ValueError(f"Hash of pk {pk!r} is longer than SNAPSHOT_HASH_WIDTH ({SNAPSHOT_HASH_WIDTH} bytes)")
+            f.write(SNAPSHOT_RECORD.pack(pk, encoded))
+    os.replace(tmp_path, path)
+
+
+def _snapshot_records(path):
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a checksum snapshot")
+        if os.fstat(f.fileno()).st_size == len(SNAPSHOT_MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for offset in range(len(SNAPSHOT_MAGIC), len(mapped), SNAPSHOT_RECORD.size):
+                yield SNAPSHOT_RECORD.unpack_from(mapped, offset)
+
+
+def read_snapshot(path):
+    """Yield the (pk, hash) pairs of a snapshot in pk order, reading the file through mmap."""
+    for pk, encoded in _snapshot_records(path):
+        yield pk, encoded.rstrip(b"\0").decode("utf-8")
+
+
+def snapshot_rows(path):
+    return (os.path.getsize(path) - len(SNAPSHOT_MAGIC)) // SNAPSHOT_RECORD.size
+
+
+def snapshot_watermark(path):
+    """Return the highest pk stored in a snapshot, or None when it is empty."""
+    size = os.path.getsize(path) - len(SNAPSHOT_MAGIC)
+    if size <= 0:
+        return None
+    with open(path, "rb") as f:
+        f.seek(len(SNAPSHOT_MAGIC) + size - SNAPSHOT_RECORD.size)
+        return SNAPSHOT_RECORD.unpack(f.read(SNAPSHOT_RECORD.size))[0]
+
+
+def merge_sorted(base_pairs, delta_pairs):
+    """Merge two pk-sorted (pk, hash) streams, the delta replacing base rows with the same pk."""
+    base_iter = iter(base_pairs)
+    delta_iter = iter(delta_pairs)
+    base = next(base_iter, None)
+    delta = next(delta_iter, None)
+    while base is not None and delta is not None:
+        if base[0] < delta[0]:
+            yield base
+            base = next(base_iter, None)
+        else:
+            if base[0] == delta[0]:
+                base = next(base_iter, None)
+            yield delta
+            delta = next(delta_iter, None)
+    while base is not None:
+        yield base
+        base = next(base_iter, None)
+    while delta is not None:
+        yield delta
+        delta = next(delta_iter, None)
+
+
+def refresh_snapshot(cursor, side, db_name, view_name, pk_field, path, args, count_cursor):
+    """Bring the snapshot of one view up to date. An existing snapshot only pulls the rows above its
+    pk watermark and merges them in, unless the view (counted on count_cursor) no longer holds as
+    many rows up to the watermark, i.e. rows were deleted. Otherwise (or with --refresh-snapshot)
+    the view is pulled completely."""
+    watermark = None
+    if os.path.exists(path) and not args.refresh_snapshot:
+        watermark = snapshot_watermark(path)
+    if watermark is not None:
+        rows = count_rows(count_cursor, db_name, view_name, f"{pk_field} <= {watermark}")
+        if rows != snapshot_rows(path):
+            print(f"{side.capitalize()} view has {rows} rows up to pk {watermark} but its snapshot holds {snapshot_rows(path)}, "
+                  "pulling it completely")
+            watermark = None
+    key_range = (watermark + 1, None) if watermark is not None else None
+
+    query = checksum_query(side, db_name, view_name, pk_field, ordered=True, key_range=key_range, numeric=True)
+    scan = ChecksumScan(cursor, query, args.batch_size, args.queue_size, side)
+    scan.start()
+    delta = check_sorted(((int(pk), row_hash) for pk, row_hash in scan), side.capitalize())
+
+    if watermark is not None:
+        # The old snapshot is read to the end, and closed, before the merged file replaces it
+        write_snapshot(path, merge_sorted(read_snapshot(path), delta))
+    else:
+        write_snapshot(path, delta)
+    print(f"{side.capitalize()} snapshot {path} refreshed from pk watermark {watermark}")
+
+
+def compare_incremental(cursor_src, cursor_tgt, args, pool):
+    """Refresh the persisted snapshots of both views with the rows appended since the last run and
+    diff the snapshots. The row counts checking for deletions are read from the SOURCE_*/TARGET_*
+    servers of the pool. Yields (pk, observation)."""
+    snapshot_id = args.snapshot_id or f"{args.db_name_src}.{args.view_name_src}-{args.db_name_tgt}.{args.view_name_tgt}"
+    path_src = os.path.join(args.snapshot_dir, f"{snapshot_id}.source.snap")
+    path_tgt = os.path.join(args.snapshot_dir, f"{snapshot_id}.target.snap")
+
+    conn_src, conn_tgt = pool.acquire("source"), pool.acquire("target")
+    try:
+        with STATS.phase("build"), ThreadPoolExecutor(max_workers=2) as executor:
+            refreshed = [executor.submit(refresh_snapshot, cursor_src, "source", args.db_name_src, args.view_name_src,
+                                         args.pk_field_src, path_src, args, conn_src.cursor()),
+                         executor.submit(refresh_snapshot, cursor_tgt, "target", args.db_name_tgt, args.view_name_tgt,
+                                         args.pk_field_tgt, path_tgt, args, conn_tgt.cursor())]
+            for future in refreshed:
+                future.result()
+    except Exception:
+        pool.discard(conn_src)
+        pool.discard(conn_tgt)
+        raise
+    pool.release(conn_src)
+    pool.release(conn_tgt)
+
+    return diff_sorted(read_snapshot(path_src), read_snapshot(path_tgt))
+
+
+def range_label(key_range):
+    """Name of a pk range in the results and checkpoints of a run: 'all' for a whole view, else 'LOW..HIGH'
+    with open ends left empty."""
+    if key_range is None:
+        return "all"
+    return "..".join("" if bound is None else str(bound) for bound in key_range)
+
+
+def split_key_range(low, high, partitions):
+    """Split the inclusive [low, high] pk range into contiguous (low, high) partitions. The first and
+    last partitions are left open-ended so keys outside the given range are still compared."""
+    size = -(-(high - low + 1) // partitions)
+    ranges = [(start, min(start + size - 1, high)) for start in range(low, high + 1, size)]
+    ranges[0] = (None, ranges[0][1])
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+class ConnectionPool:
+    """Keeps opened connections to each of the SERVERS for reuse across comparisons and partitions.
+    All connections share the JVM started by the first one, so the JVM and driver are loaded once."""
+
+    def __init__(self):
+        self.idle = {server: queue.LifoQueue() for server in SERVERS}
+        self.lock = threading.Lock()
+        self.opened = {}
+
+    def acquire(self, server="host"):
+        try:
+            return self.idle[server].get_nowait()
+        except queue.Empty:
+            conn = connect(server)
+            with self.lock:
+                self.opened[conn] = server
+            return conn
+
+    def release(self, conn):
+        self.idle[self.opened[conn]].put(conn)
+
+    def discard(self, conn):
+        """Close a connection left in an unknown state (e.g. by a failed scan) instead of reusing it."""
+        with self.lock:
+            del self.opened[conn]
+        conn.close()
+
+    def close(self):
+        with self.lock:
+            for conn in self.opened:
+                conn.close()
+            self.opened = {}
+
+
+_NUMERIC_TYPES = (jaydebeapi.NUMBER, jaydebeapi.FLOAT, jaydebeapi.DECIMAL)
+
+
+def pk_is_numeric(cursor, db_name, view_name, pk_field):
+    """Tell from the metadata of an empty query whether the pk column of a view is numeric."""
+    cursor.execute(f"SELECT {pk_field} FROM {db_name}.{view_name} WHERE 1 = 0")
+    cursor.fetchall()
+    return cursor.description[0][1] in _NUMERIC_TYPES
+
+
+def sql_literal(value, numeric=False):
+    """Render a pk as a literal for a numeric or a text pk column, whatever the type of the value
+    (the checksum procedures return every pk as text)."""
+    if numeric:
+        return format(Decimal(str(value)), "f")
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def fetch_rows_by_key(cursor, db_name, view_name, pk_field, pks, numeric=False):
+    """Fetch the rows of a view whose pk is one of pks. Returns {normalized pk: {column: value}}."""
+    literals = ", ".join(sql_literal(pk, numeric) for pk in pks)
+    cursor.execute(f"SELECT * FROM {db_name}.{view_name} WHERE {pk_field} IN ({literals})")
+    columns = [column[0].lower() for column in cursor.description]
+    pk_index = columns.index(pk_field.lower())
+    return {normalize_value(row[pk_index]): dict(zip(columns, row)) for row in cursor.fetchall()}
+
+
+def _sample(value):
+    return None if value is None else str(value)[:DRILLDOWN_VALUE_LENGTH]
+
+
+def drill_down(args, column_writer, pool, pks, scope):
+    """Fetch the mismatching pks from both views in chunks and record every column whose values
+    differ. Returns {column: number of keys where it differs}."""
+    conn_src, conn_tgt = pool.acquire("source"), pool.acquire("target")
+    differing = {}
+    try:
+        cursor_src, cursor_tgt = conn_src.cursor(), conn_tgt.cursor()
+        with STATS.phase("drilldown"), ThreadPoolExecutor(max_workers=2) as executor:
+            numeric_src = executor.submit(pk_is_numeric, cursor_src, args.db_name_src, args.view_name_src, args.pk_field_src)
+            numeric_tgt = executor.submit(pk_is_numeric, cursor_tgt, args.db_name_tgt, args.view_name_tgt, args.pk_field_tgt)
+            numeric_src, numeric_tgt = numeric_src.result(), numeric_tgt.result()
+            for start in range(0, len(pks), args.drilldown_chunk_size):
+                chunk = pks[start:start + args.drilldown_chunk_size]
+                rows_src = executor.submit(fetch_rows_by_key, cursor_src, args.db_name_src, args.view_name_src, args.pk_field_src,
+                                           chunk, numeric_src)
+                rows_tgt = executor.submit(fetch_rows_by_key, cursor_tgt, args.db_name_tgt, args.view_name_tgt, args.pk_field_tgt,
+                                           chunk, numeric_tgt)
+                rows_src, rows_tgt = rows_src.result(), rows_tgt.result()
+                for key, row_src in rows_src.items():
+                    row_tgt = rows_tgt.get(key)
+                    if row_tgt is None:
+                        continue
+                    # Columns present on one side only are reported by the metadata comparison
+                    for column in sorted(row_src.keys() & row_tgt.keys()):
+                        if normalize_value(row_src[column]) != normalize_value(row_tgt[column]):
+                            differing[column] = differing.get(column, 0) + 1
+                            column_writer.write_row((args.view_name_src, args.view_name_tgt, key, column,
+                                                     _sample(row_src[column]), _sample(row_tgt[column])), scope)
+        cursor_src.close()
+        cursor_tgt.close()
+    except Exception:
+        pool.discard(conn_src)
+        pool.discard(conn_tgt)
+        raise
+    pool.release(conn_src)
+    pool.release(conn_tgt)
+    return differing
+
+
+def write_differences(args, writer, pool, key_range=None, column_writer=None, progress=None):
+    """Compare one view pair (or one pk range of it) on a pooled source/target connection pair and
+    write its differences, drilling down into the mismatches when a column_writer is given. With a
+    progress, ranges already checkpointed are skipped and the range is checkpointed when done.
+    Returns the number of differences."""
+    label = range_label(key_range)
+    # Pairs of a manifest may use the same view names in different databases
+    scope = (args.db_name_src, args.db_name_tgt, label)
+    writers = [writer] if column_writer is None else [writer, column_writer]
+    if progress is not None:
+        done = progress.differences(args.view_name_src, args.view_name_tgt, scope)
+        if done is not None:
+            print(f"{args.view_name_src} {label}: completed by an earlier attempt of run {progress.run_id}, skipping")
+            return done
+        # Drop whatever an interrupted attempt committed for this range before comparing it again
+        for result_writer in writers:
+            result_writer.clear_range(args.view_name_src, args.view_name_tgt, scope)
+
+    if args.iblt:
+        # The source side is the shipped summary, so only the target is read
+        conns = [pool.acquire("target" if args.client_hash else "host")]
+    elif args.client_hash:
+        conns = [pool.acquire("source"), pool.acquire("target")]
+    else:
+        conns = [pool.acquire(), pool.acquire()]
+    try:
+        cursors = [conn.cursor() for conn in conns]
+        if args.iblt:
+            differences = compare_iblt(cursors[0], args)
+        elif args.incremental:
+            differences = compare_incremental(*cursors, args, pool)
+        elif args.mode == "hierarchical":
+            differences = compare_hierarchical(*cursors, args)
+        else:
+            differences = compare(*cursors, args, key_range)
+        count = 0
+        mismatches = []
+        differences = iter(differences)
+        while True:
+            # Streaming modes fetch lazily, so this includes waiting for the scans
+            with STATS.phase("diff"):
+                difference = next(differences, None)
+            if difference is None:
+                break
+            writer.write(args.view_name_src, args.view_name_tgt, difference[0], difference[1], scope)
+            count += 1
+            if column_writer is not None and difference[1] == MISMATCH and len(mismatches) < args.drilldown_max_keys:
+                mismatches.append(difference[0])
+        STATS.count("differences", count)
+        for cursor in cursors:
+            cursor.close()
+    except Exception:
+        for conn in conns:
+            pool.discard(conn)
+        raise
+    for conn in conns:
+        pool.release(conn)
+
+    if mismatches:
+        differing = drill_down(args, column_writer, pool, mismatches, scope)
+        summary = ", ".join(f"{column} ({keys})" for column, keys in sorted(differing.items()))
+        print(f"{args.view_name_src}: columns differing in {len(mismatches)} mismatching keys: {summary or 'none'}")
+    if progress is not None:
+        progress.complete(args.view_name_src, args.view_name_tgt, scope, count, writers)
+    return count
+
+
+def compare_partitioned(args, writer, pool, column_writer=None, progress=None):
+    """Compare each pk range on its own source/target connection pair in a worker pool, writing
+    every partition's differences through the shared writer. Returns the number of differences."""
+    ranges = split_key_range(args.key_range[0], args.key_range[1], args.partitions)
+    total = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        counts = executor.map(lambda key_range: write_differences(args, writer, pool, key_range, column_writer, progress), ranges)
+        for key_range, differences in zip(ranges, counts):
+            print(f"Partition {key_range}: {differences} differences")
+            total += differences
+    return total
+
+
+def run_comparison(args, writer, pool, column_writer=None, progress=None):
+    """Compare the view pair described by args. Returns the number of differences."""
+    if args.partitions > 1:
+        return compare_partitioned(args, writer, pool, column_writer, progress)
+    return write_differences(args, writer, pool, column_writer=column_writer, progress=progress)
+
+
+MANIFEST_FIELDS = ("pk_field_src", "view_name_src", "db_name_src", "pk_field_tgt", "view_name_tgt", "db_name_tgt")
+
+
+def load_manifest(path):
+    """Read the view pairs of a batch run from a CSV file with a header row, or from a JSON list of
+    objects, using the MANIFEST_FIELDS names."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            entries = json.load(f)
+        else:
+            entries = list(csv.DictReader(f))
+    for number, entry in enumerate(entries, 1):
+        missing = [field for field in MANIFEST_FIELDS if not entry.get(field)]
+        if missing:
+            raise ValueError(f"Manifest entry {number} in {path} is missing {', '.join(missing)}")
+    return [{field: str(entry[field]).strip() for field in MANIFEST_FIELDS} for entry in entries]
+
+
+def run_batch(args, writer, pool, column_writer=None, progress=None):
+    """Run every comparison of the manifest concurrently on the shared connection pool and writer.
+    A failing comparison is reported and does not stop the others. Returns the number of failures."""
+    entries = load_manifest(args.manifest)
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.batch_workers) as executor:
+        futures = {executor.submit(run_comparison, argparse.Namespace(**{**vars(args), **entry}), writer, pool, column_writer, progress): entry
+                   for entry in entries}
+        for future in as_completed(futures):
+            entry = futures[future]
+            name = f"{entry['db_name_src']}.{entry['view_name_src']} -> {entry['db_name_tgt']}.{entry['view_name_tgt']}"
+            try:
+                print(f"{name}: {future.result()} differences")
+            except Exception as e:
+                failures += 1
+                print(f"{name}: failed: {e}")
+    print(f"Compared {len(entries) - failures} of {len(entries)} view pairs")
+    return failures
+
+
+class ResultWriter:
+    """Buffers comparison results and writes them to a report view (bv_checksum_comparison by
+    default) with executemany, committing one explicit transaction per batch. Safe to share between
+    comparison threads. With a run_id, every row is tagged with the run id and its scope: the source
+    and target databases and the label of its pk range."""
+
+    def __init__(self, conn, batch_size=INSERT_BATCH_SIZE, view="bv_checksum_comparison", columns=RESULT_COLUMNS, run_id=None):
+        self.conn = conn
+        self.conn.jconn.setAutoCommit(False)
+        self.cursor = conn.cursor()
+        self.view = view
+        self.run_id = run_id
+        if run_id is not None:
+            columns += RUN_COLUMNS
+        self.insert_sql = f"INSERT INTO vdb_testing_tool.{view} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        self.batch_size = batch_size
+        self.buffer = []
+        self.rows_written = 0
+        self.write_time = 0.0
+        self.lock = threading.Lock()
+
+    def clear(self):
+        """Delete the results of the run id, or of every earlier run without one. Results kept under
+        a run id are left alone by runs without one."""
+        if self.run_id is None:
+            self.cursor.execute(f"delete from vdb_testing_tool.{self.view} where run_id is null")
+        else:
+            self.cursor.execute(f"delete from vdb_testing_tool.{self.view} where run_id = ?", (self.run_id,))
+        self.conn.commit()
+
+    def clear_range(self, view_name_src, view_name_tgt, scope):
+        with self.lock:
+            self.cursor.execute(f"delete from vdb_testing_tool.{self.view} where run_id = ? and source_view_name = ? "
+                                f"and target_view_name = ? and source_db_name = ? and target_db_name = ? and key_range = ?",
+                                (self.run_id, view_name_src, view_name_tgt, *scope))
+            self.conn.commit()
+
+    def write(self, view_name_src, view_name_tgt, pk, observation, scope):
+        self.write_row((view_name_tgt, str(pk), observation, view_name_src), scope)
+
+    def write_row(self, row, scope):
+        if self.run_id is not None:
+            row = (*row, self.run_id, *scope)
+        with self.lock:
+            self.buffer.append(row)
+            if len(self.buffer) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        start = time.perf_counter()
+        try:
+            self.cursor.executemany(self.insert_sql, self.buffer)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        self.write_time += time.perf_counter() - start
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.cursor.close()
+        rate = self.rows_written / self.write_time if self.write_time else 0.0
+        print(f"Wrote {self.rows_written} rows to {self.view} in {self.write_time:.2f}s ({rate:.0f} rows/sec)")
+
+
+class RunProgress:
+    """Checkpoints of a run id in vdb_testing_tool.bv_checksum_run_progress: one row per view pair and
+    scope (databases and pk range) whose results are committed. Resuming loads them, otherwise the
+    run id starts over."""
+
+    def __init__(self, conn, run_id, resume=False):
+        self.conn = conn
+        self.conn.jconn.setAutoCommit(False)
+        self.cursor = conn.cursor()
+        self.run_id = run_id
+        self.lock = threading.Lock()
+        self.completed = {}
+        if resume:
+            self.cursor.execute("SELECT source_view_name, target_view_name, source_db_name, target_db_name, key_range, "
+                                "differences FROM vdb_testing_tool.bv_checksum_run_progress WHERE run_id = ?", (run_id,))
+            self.completed = {tuple(row[:5]): int(row[5]) for row in self.cursor.fetchall()}
+            print(f"Resuming run {run_id}: {len(self.completed)} ranges already compared")
+        else:
+            self.cursor.execute("DELETE FROM vdb_testing_tool.bv_checksum_run_progress WHERE run_id = ?", (run_id,))
+            self.conn.commit()
+
+    def differences(self, view_name_src, view_name_tgt, scope):
+        """Number of differences of a checkpointed range, or None if it still has to be compared."""
+        return self.completed.get((view_name_src, view_name_tgt, *scope))
+
+    def complete(self, view_name_src, view_name_tgt, scope, differences, writers):
+        # The results go first, so a checkpointed range never misses rows
+        for writer in writers:
+            writer.flush()
+        with self.lock:
+            self.cursor.execute(PROGRESS_SQL, (self.run_id, view_name_src, view_name_tgt, *scope, differences,
+                                               datetime.now().isoformat(sep=" ", timespec="seconds")))
+            self.conn.commit()
+
+    def close(self):
+        self.cursor.close()
+
+
+def write_run_stats(conn, report):
+    """Insert the run report as a row of vdb_testing_tool.bv_checksum_run_stats."""
+    phases = report["phases"]
+    counters = report["counters"]
+    cursor = conn.cursor()
+    cursor.execute(RUN_STATS_SQL, (
+        report["source_view_name"], report["target_view_name"], report["started_at"], report["mode"],
+        report["total_seconds"], phases.get("source_scan", 0.0), phases.get("target_scan", 0.0),
+        phases.get("build", 0.0), phases.get("diff", 0.0), phases["insert"],
+        counters.get("source_rows_fetched", 0) + counters.get("target_rows_fetched", 0),
+        counters.get("bytes_fetched", 0), counters["rows_written"], report["insert_rows_per_second"],
+        json.dumps(report)))
+    conn.commit()
+    cursor.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Row-level checksum comparison of a source and a target Denodo view")
+    parser.add_argument("pk_field_src", nargs="?", help="Primary key field of the source view")
+    parser.add_argument("view_name_src", nargs="?", help="Name of the source view")
+    parser.add_argument("db_name_src", nargs="?", help="Virtual database of the source view")
+    parser.add_argument("pk_field_tgt", nargs="?", help="Primary key field of the target view")
+    parser.add_argument("view_name_tgt", nargs="?", help="Name of the target view")
+    parser.add_argument("db_name_tgt", nargs="?", help="Virtual database of the target view")
+    parser.add_argument("--manifest", help="CSV or JSON file listing the view pairs to compare instead of the positional arguments")
+    parser.add_argument("--batch-workers", type=int, default=BATCH_WORKERS, help="View pairs of the manifest compared at the same time")
+    parser.add_argument("--report", default=RUN_REPORT, help="File the JSON run report is written to")
+    parser.add_argument("--write-run-stats", action="store_true", default=WRITE_RUN_STATS,
+                        help="Also insert the run report into vdb_testing_tool.bv_checksum_run_stats")
+    parser.add_argument("--mode", choices=("memory", "streaming", "compact", "external", "hierarchical"), default=COMPARE_MODE, help="Comparison mode")
+    parser.add_argument("--batch-size", type=int, default=FETCH_BATCH_SIZE, help="Rows fetched per round trip")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE, help="Fetched batches buffered per checksum scan")
+    parser.add_argument("--insert-batch-size", type=int, default=INSERT_BATCH_SIZE, help="Result rows written per transaction")
+    parser.add_argument("--partitions", type=int, default=PARTITIONS, help="Number of pk ranges compared in parallel")
+    parser.add_argument("--workers", type=int, default=PARTITION_WORKERS, help="Worker threads comparing partitions")
+    parser.add_argument("--key-range", type=int, nargs=2, metavar=("LOW", "HIGH"), help="Expected numeric pk range to partition")
+    parser.add_argument("--run-size", type=int, default=EXTERNAL_RUN_SIZE, help="Pairs sorted in memory per spilled run in external mode")
+    parser.add_argument("--spill-dir", default=SPILL_DIR, help="Directory for the sorted runs of the external mode")
+    parser.add_argument("--bucket-size", type=int, default=ROLLUP_BUCKET_SIZE, help="Keys per rollup bucket in hierarchical mode")
+    parser.add_argument("--client-hash", action="store_true", default=CLIENT_HASH,
+                        help="Read the views directly and compute the row digests in this script")
+    parser.add_argument("--hash-workers", type=int, default=HASH_WORKERS, help="Processes hashing rows in client-hash mode")
+    parser.add_argument("--drilldown", action="store_true", default=DRILLDOWN,
+                        help="Record which columns differ for the mismatching keys in bv_checksum_column_comparison")
+    parser.add_argument("--drilldown-chunk-size", type=int, default=DRILLDOWN_CHUNK_SIZE, help="Keys per IN list of the drill-down")
+    parser.add_argument("--drilldown-max-keys", type=int, default=DRILLDOWN_MAX_KEYS, help="Mismatching keys drilled down per comparison")
+    parser.add_argument("--quick-check", action="store_true",
+                        help="Only compare the row counts and a sample of the checksums, and estimate the mismatch rate")
+    parser.add_argument("--sample-modulus", type=int, default=SAMPLE_MODULUS, help="Quick check 1 in N keys")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE, help="Confidence level of the quick check bounds")
+    parser.add_argument("--summarize", metavar="FILE", help="Only save a summary of the source view to FILE, for --iblt")
+    parser.add_argument("--iblt", metavar="FILE", help="Compare the target view with the source summary in FILE")
+    parser.add_argument("--iblt-cells", type=int, default=IBLT_CELLS, help="Cells of the summary written by --summarize")
+    parser.add_argument("--run-id", default=RUN_ID, help="Keep the results under this run id and checkpoint each compared range")
+    parser.add_argument("--resume", action="store_true", help="Continue the run id, skipping the ranges it already compared")
+    parser.add_argument("--incremental", action="store_true", help="Compare persisted snapshots refreshed with the rows appended since the last run")
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR, help="Directory holding the incremental snapshots")
+    parser.add_argument("--snapshot-id", help="Name of the snapshot pair to compare against (defaults to the view names)")
+    parser.add_argument("--refresh-snapshot", action="store_true", help="Rebuild the snapshots from a complete pull")
+    args = parser.parse_args(argv)
+    if args.manifest is None and None in (args.pk_field_src, args.view_name_src, args.db_name_src,
+                                          args.pk_field_tgt, args.view_name_tgt, args.db_name_tgt):
+        parser.error("either the six view arguments or --manifest are required")
+    if args.mode == "compact" and np is None:
+        parser.error("The compact mode requires NumPy (pip install numpy)")
+    if args.incremental and (args.partitions > 1 or args.mode == "hierarchical"):
+        parser.error("--incremental cannot be combined with --partitions or the hierarchical mode")
+    if args.client_hash and (args.incremental or args.mode == "hierarchical"):
+        parser.error("--client-hash cannot be combined with --incremental or the hierarchical mode")
+    if (args.summarize or args.iblt) and (args.manifest or args.partitions > 1 or args.incremental or args.mode == "hierarchical"):
+        parser.error("--summarize and --iblt cannot be combined with --manifest, --partitions, --incremental or the hierarchical mode")
+    if args.quick_check and (args.manifest or args.partitions > 1 or args.incremental or args.summarize or args.iblt):
+        parser.error("--quick-check cannot be combined with --manifest, --partitions, --incremental, --summarize or --iblt")
+    if not 0 < args.confidence < 1:
+        parser.error("--confidence must be between 0 and 1")
+    if args.summarize and args.iblt:
+        parser.error("--summarize and --iblt are run on different sites, one at a time")
+    if args.iblt and args.drilldown:
+        parser.error("--drilldown reads the source view, which --iblt leaves remote")
+    if args.resume and args.run_id is None:
+        parser.error("--resume requires --run-id")
+    if not 1 <= args.bucket_size <= ROLLUP_MAX_BUCKET_SIZE:
+        parser.error(f"--bucket-size must be between 1 and {ROLLUP_MAX_BUCKET_SIZE}")
+    if args.partitions < 1:
+        parser.error("--partitions must be at least 1")
+    if args.key_range is not None and args.key_range[0] > args.key_range[1]:
+        parser.error("--key-range LOW must not be greater than HIGH")
+    if args.partitions > 1 and args.key_range is None:
+        parser.error("--partitions requires --key-range LOW HIGH")
+    if args.partitions > 1 and args.mode == "hierarchical":
+        parser.error("--partitions cannot be combined with the hierarchical mode")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.summarize or args.quick_check:
+        # Neither writes row-level results, so the results of the last full comparison are kept
+        pool = ConnectionPool()
+        try:
+            if args.summarize:
+                summarize(args, pool)
+                return 0
+            report = quick_check(args, pool)
+        finally:
+            pool.close()
+            if _hash_pool is not None:
+                _hash_pool.shutdown()
+        print(json.dumps(report, indent=2))
+        if args.report:
+            with open(args.report, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+        return 0
+
+    # Results are written through their own connection so its transactions never touch the open checksum scans
+    conn_out = connect()
+    writer = ResultWriter(conn_out, args.insert_batch_size, run_id=args.run_id)
+    if not args.resume:
+        writer.clear()
+    pool = ConnectionPool()
+    column_writer = None
+    if args.drilldown:
+        conn_columns = connect()
+        column_writer = ResultWriter(conn_columns, args.insert_batch_size, "bv_checksum_column_comparison",
+                                     COLUMN_RESULT_COLUMNS, args.run_id)
+        if not args.resume:
+            column_writer.clear()
+    progress = None
+    if args.run_id is not None:
+        conn_progress = connect()
+        progress = RunProgress(conn_progress, args.run_id, args.resume)
+
+    failures = 0
+    try:
+        if args.manifest:
+            failures = run_batch(args, writer, pool, column_writer, progress)
+        else:
+            run_comparison(args, writer, pool, column_writer, progress)
+    finally:
+        writer.close()
+        if column_writer is not None:
+            column_writer.close()
+            conn_columns.close()
+        if progress is not None:
+            progress.close()
+            conn_progress.close()
+        pool.close()
+        if _hash_pool is not None:
+            _hash_pool.shutdown()
+
+    if args.iblt:
+        mode = "iblt"
+    elif args.incremental:
+        mode = "incremental"
+    elif args.partitions > 1:
+        mode = f"{args.mode}, {args.partitions} partitions"
+    else:
+        mode = args.mode
+    writers = [writer] if column_writer is None else [writer, column_writer]
+    report = STATS.report(writers, mode=mode, run_id=args.run_id,
+                          source_view_name=args.manifest or f"{args.db_name_src}.{args.view_name_src}",
+                          target_view_name=args.manifest or f"{args.db_name_tgt}.{args.view_name_tgt}")
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.write_run_stats:
+        write_run_stats(conn_out, report)
+    conn_out.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,64 +1,330 @@
 import os
 import json
+import math
+import time
+import hashlib
+import sqlite3
+import random
+import asyncio
 import argparse
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
 import requests
 import pandas as pd
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor
 import logging
+try:
+    import httpx
+except ImportError:
+    httpx = None
 pd.options.mode.chained_assignment = None
 logger = logging.getLogger(__name__)
 
-def call_answer_question_api(question: str, evidence: str, api_url: str,  username: str , password: str, pbar=None):
-    """
-    Call the Q&A API with a single question and evidence.
+# Questions in flight when the asyncio driver starts, before the limiter adapts it, and the
+# timeout of a single AI SDK call (LLM calls commonly take 20-60 s)
+ASYNC_INITIAL_CONCURRENCY = 10
+ASYNC_REQUEST_TIMEOUT = 300.0
+# Disk space used by the opt-in AI SDK response cache before least recently used answers are evicted
+RESPONSE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Retries of AI SDK calls answered with these statuses or failing to connect, with full-jitter
+# exponential backoff (a Retry-After header takes precedence), capped at AI_SDK_BACKOFF_MAX seconds
+AI_SDK_MAX_RETRIES = 3
+AI_SDK_BACKOFF_FACTOR = 1.0
+AI_SDK_BACKOFF_MAX = 60.0
+AI_SDK_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# All AI SDK calls pause for CIRCUIT_BREAKER_PAUSE seconds once this share of the last
+# CIRCUIT_BREAKER_WINDOW attempts failed (0 disables the circuit breaker)
+CIRCUIT_BREAKER_ERROR_RATE = 0.5
+CIRCUIT_BREAKER_WINDOW = 20
+CIRCUIT_BREAKER_PAUSE = 30.0
+# Phases of the AI SDK calls summarized by latency_report: measured by the client, then reported by the AI SDK
+LATENCY_PHASES = ("queue_wait", "client_latency", "sql_execution_time", "vector_store_search_time",
+                  "llm_time", "total_execution_time")
+LATENCY_HISTOGRAM_SUB_BUCKETS = 4
 
-    Args:
-    question: The question to answer
-    evidence: Supporting evidence to use for answering
-    api_url: API endpoint URL
-    username: Authentication username
-    password: Authentication password
-    pbar: Optional progress bar to update
 
-    Returns:
-    dict: JSON response from API or error dict
-    """
-     
-    params = {
+def _question_params(question, evidence):
+    return {
         "question": question,
         "custom_instructions": evidence,
         "markdown_response": "false",
         "disclaimer": "false"
     }
-    logger.info("Submitting question to API endpoint: '%s'", api_url)
-    logger.debug("Using API credentials: user=%s", username)
-    logger.debug("Full question: '%s', Evidence: '%s'", question, evidence)
+
+
+class ResponseCache:
+    """
+    On-disk cache of successful AI SDK responses in a SQLite file, so that re-running an
+    evaluation after scoring-only changes does not pay the LLM latency again. Responses are
+    keyed by the hash of the endpoint, question, custom instructions and AI SDK version, and
+    the least recently used ones are evicted once the stored responses exceed max_bytes.
+    """
+    def __init__(self, path: str, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, sdk_version: str = ''):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sdk_version = sdk_version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ai_sdk_responses ("
+            "key TEXT PRIMARY KEY, response TEXT, size INTEGER, accessed REAL)")
+        self.conn.commit()
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM ai_sdk_responses").fetchone()[0]
+
+    def make_key(self, api_url: str, question, custom_instructions) -> str:
+        return hashlib.sha256(json.dumps(
+            [api_url, str(question), str(custom_instructions), self.sdk_version]).encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """Return the cached response for key, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT response FROM ai_sdk_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE ai_sdk_responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, response: dict):
+        data = json.dumps(response, default=str)
+        size = len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.conn.execute("SELECT size FROM ai_sdk_responses WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO ai_sdk_responses VALUES (?, ?, ?, ?)",
+                              (key, data, size, time.time()))
+            self.size += size - (previous[0] if previous else 0)
+            while self.size > self.max_bytes:
+                oldest = self.conn.execute(
+                    "SELECT key, size FROM ai_sdk_responses ORDER BY accessed LIMIT 1").fetchone()
+                self.conn.execute("DELETE FROM ai_sdk_responses WHERE key = ?", (oldest[0],))
+                self.size -= oldest[1]
+                self.evictions += 1
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM ai_sdk_responses")
+            self.conn.commit()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM ai_sdk_responses").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': self.size,
+                'evictions': self.evictions, 'sdk_version': self.sdk_version}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_RESPONSE_CACHE = None
+
+def configure_response_cache(path: str = None, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, sdk_version: str = '',
+                             refresh: bool = False):
+    """
+    Enable the on-disk AI SDK response cache used by call_answer_question_api and its asyncio driver.
+
+    Args:
+    path: SQLite file holding the cache, or None to disable it
+    max_bytes: Size of the stored responses above which the least recently used are evicted
+    sdk_version: Version of the AI SDK answering, part of the key so that upgrades are not served stale answers
+    refresh: Delete the cached responses first
+
+    Returns:
+    ResponseCache or None
+    """
+    global _RESPONSE_CACHE
+    if _RESPONSE_CACHE is not None:
+        _RESPONSE_CACHE.close()
+    _RESPONSE_CACHE = ResponseCache(path, max_bytes, sdk_version) if path else None
+    if _RESPONSE_CACHE is not None and refresh:
+        _RESPONSE_CACHE.clear()
+    return _RESPONSE_CACHE
+
+def response_cache_stats():
+    """Return the hit/miss counters of the response cache, or None if it is disabled."""
+    return _RESPONSE_CACHE.stats() if _RESPONSE_CACHE is not None else None
+
+def _cached_response(api_url, question, evidence):
+    if _RESPONSE_CACHE is None:
+        return None, None
+    key = _RESPONSE_CACHE.make_key(api_url, question, evidence)
+    return key, _RESPONSE_CACHE.get(key)
+
+def _cache_response(key, result):
+    # Errors are never cached, so that they are retried by the next run
+    if key is not None and _RESPONSE_CACHE is not None and "error" not in result:
+        _RESPONSE_CACHE.put(key, result)
+
+class CircuitBreaker:
+    """
+    Pauses the AI SDK calls of every worker when the error rate of the last attempts spikes,
+    giving an overloaded AI SDK time to recover instead of failing the remaining questions.
+    """
+    def __init__(self, error_rate: float = CIRCUIT_BREAKER_ERROR_RATE, window: int = CIRCUIT_BREAKER_WINDOW,
+                 pause: float = CIRCUIT_BREAKER_PAUSE):
+        self.error_rate = error_rate
+        self.pause = pause
+        self.outcomes = deque(maxlen=window)
+        self.open_until = 0.0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def record(self, failed: bool):
+        with self.lock:
+            self.outcomes.append(failed)
+            if (self.error_rate and len(self.outcomes) == self.outcomes.maxlen
+                    and sum(self.outcomes) >= self.error_rate * len(self.outcomes)):
+                self.open_until = time.monotonic() + self.pause
+                self.trips += 1
+                self.outcomes.clear()
+                logger.warning("AI SDK error rate above %.0f%%, pausing calls for %.0f s", self.error_rate * 100, self.pause)
+
+    def delay(self) -> float:
+        """Seconds to wait before the next attempt, 0 if the circuit is closed."""
+        with self.lock:
+            return max(0.0, self.open_until - time.monotonic())
+
+_CIRCUIT_BREAKER = CircuitBreaker()
+
+def configure_retries(max_retries: int = None, backoff_factor: float = None, error_rate: float = None,
+                      pause: float = None):
+    """
+    Set the retry policy of the AI SDK calls and reset the circuit breaker.
+
+    Args:
+    max_retries: Retries of a question after a retryable failure
+    backoff_factor: Base of the exponential backoff between retries, in seconds
+    error_rate: Share of failed attempts that opens the circuit breaker, 0 to disable it
+    pause: Seconds the calls are paused while the circuit breaker is open
+    """
+    global AI_SDK_MAX_RETRIES, AI_SDK_BACKOFF_FACTOR, _CIRCUIT_BREAKER
+    if max_retries is not None:
+        AI_SDK_MAX_RETRIES = max_retries
+    if backoff_factor is not None:
+        AI_SDK_BACKOFF_FACTOR = backoff_factor
+    _CIRCUIT_BREAKER = CircuitBreaker(
+        CIRCUIT_BREAKER_ERROR_RATE if error_rate is None else error_rate,
+        CIRCUIT_BREAKER_WINDOW,
+        CIRCUIT_BREAKER_PAUSE if pause is None else pause,
+    )
+
+def _retry_after(headers):
+    """Seconds requested by a Retry-After header (delay or HTTP date), or None."""
+    value = headers.get("Retry-After") if headers is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _retry_delay(retry: int, retry_after=None) -> float:
+    if retry_after is not None:
+        return min(retry_after, AI_SDK_BACKOFF_MAX)
+    return random.uniform(0, min(AI_SDK_BACKOFF_MAX, AI_SDK_BACKOFF_FACTOR * 2 ** (retry - 1)))
+
+def _with_outcome(result: dict, status: str, retries: int, submitted: float, started: float) -> dict:
+    # queue_wait: from submission to the first attempt; client_latency: from the first attempt to the final answer
+    finished = time.monotonic()
+    return {**result, "api_status": status, "api_retries": retries,
+            "queue_wait": started - submitted if submitted is not None else 0.0,
+            "client_latency": finished - started}
+
+def _send_question(params, api_url, username, password, question):
+    """
+    Make a single attempt of an AI SDK call.
+
+    Returns:
+    tuple: (result dict, final status, whether the failure is retryable, Retry-After seconds or None)
+    """
     try:
         response = requests.get(api_url, params=params, auth=requests.auth.HTTPBasicAuth(username, password))
         response.raise_for_status()
 
         try:
-            result = response.json()
+            return response.json(), "ok", False, None
         except ValueError as json_err:
-            logger.debug("Invalid JSON response for question '%s': %s", question)
-            result = {"error": f"Invalid JSON response: {json_err}", "response_text": response.text}
+            logger.debug("Invalid JSON response for question '%s': %s", question, json_err)
+            return {"error": f"Invalid JSON response: {json_err}", "response_text": response.text}, "invalid JSON", False, None
     except requests.RequestException as err:
         if err.response is not None and err.response.status_code == 500:
             logger.info("Server returned a 500 error for question '%s': %s", question, err)
         else:
             logger.error("Error for question '%s': %s", question, err)
-        result = {"error": str(err)}
-    
+        if err.response is not None:
+            status_code = err.response.status_code
+            return ({"error": str(err)}, f"HTTP {status_code}", status_code in AI_SDK_RETRY_STATUSES,
+                    _retry_after(err.response.headers))
+        return {"error": str(err)}, type(err).__name__, True, None
+
+def call_answer_question_api(question: str, evidence: str, api_url: str,  username: str , password: str, pbar=None,
+                             submitted: float = None):
+    """
+    Call the Q&A API with a single question and evidence.
+
+    Args:
+    question: The question to answer
+    evidence: Supporting evidence to use for answering
+    api_url: API endpoint URL
+    username: Authentication username
+    password: Authentication password
+    pbar: Optional progress bar to update
+    submitted: time.monotonic() at which the call was queued, to measure its queue wait
+
+    Returns:
+    dict: JSON response from API or error dict, with the final api_status, the api_retries made,
+    the queue_wait and the client_latency in seconds
+    """
+     
+    started = time.monotonic()
+    params = _question_params(question, evidence)
+    cache_key, result = _cached_response(api_url, question, evidence)
+    if result is not None:
+        logger.debug("Using cached response for question '%s'", question)
+        if pbar:
+            pbar.update(1)
+        return _with_outcome(result, "cached", 0, submitted, started)
+    logger.info("Submitting question to API endpoint: '%s'", api_url)
+    logger.debug("Using API credentials: user=%s", username)
+    logger.debug("Full question: '%s', Evidence: '%s'", question, evidence)
+    retries = 0
+    while True:
+        pause = _CIRCUIT_BREAKER.delay()
+        if pause:
+            time.sleep(pause)
+        result, status, retryable, retry_after = _send_question(params, api_url, username, password, question)
+        _CIRCUIT_BREAKER.record(retryable)
+        if not retryable or retries >= AI_SDK_MAX_RETRIES:
+            break
+        retries += 1
+        delay = _retry_delay(retries, retry_after)
+        logger.info("Retrying question '%s' in %.1f s (retry %d/%d) after %s", question, delay, retries, AI_SDK_MAX_RETRIES, status)
+        time.sleep(delay)
+    _cache_response(cache_key, result)
 
     if pbar:
         pbar.update(1)
     
-    return result
+    return _with_outcome(result, status, retries, submitted, started)
 
 
 
-def call_answer_question_api_multiple(questions, evidences, api_url: str , username: str , password: str , max_workers: int = 10):
+def call_answer_question_api_multiple(questions, evidences, api_url: str , username: str , password: str , max_workers: int = 10,
+                                      on_response=None):
     '''
     Call the AI SDK API in parallel.
     Args:
@@ -68,18 +334,24 @@ def call_answer_question_api_multiple(questions, evidences, api_url: str , usern
     username: Authentication username
     password: Authentication password
     max_workers: Maximum number of parallel workers
+    on_response: Optional callable(position, response) called as each response arrives
     
     Returns:
     List of JSON responses from the API
 
     '''
+    submitted = time.monotonic()
+
+    def call(position, question, evidence):
+        response = call_answer_question_api(question, evidence, api_url, username, password, pbar, submitted)
+        if on_response:
+            on_response(position, response)
+        return response
+
     with tqdm(total=len(questions), desc="Making API calls") as pbar:
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
             try:
-                responses = list(executor.map(
-                    lambda q_e: call_answer_question_api(q_e[0], q_e[1], api_url, username, password, pbar), 
-                    zip(questions, evidences)
-                ))
+                responses = list(executor.map(call, range(len(questions)), questions, evidences))
             except Exception as e:
                 logger.exception("Error during API calls: %s", str(e))
                 responses = [{"error": str(e)}] * len(questions)
@@ -89,7 +361,241 @@ def call_answer_question_api_multiple(questions, evidences, api_url: str , usern
 
 
 
-def generate_responses(questions, evidences, api_url: str , username: str , password: str , max_workers = 10):
+class AIMDLimiter:
+    """
+    Adaptive limit on the AI SDK calls in flight (additive increase, multiplicative decrease).
+    
+    Until the first decrease every successful call raises the limit by one, doubling it per round
+    of calls (slow start); afterwards by 1/limit, i.e. by one per round. A call rejected as
+    overloaded (429, 5xx, transport error) or slower than latency_factor times the running
+    average latency multiplies it by backoff_ratio. Only calls started after the last decrease
+    can decrease it again, so a burst of failures backs off once.
+    """
+    def __init__(self, initial: int = ASYNC_INITIAL_CONCURRENCY, min_limit: int = 1, max_limit: int = 100,
+                 backoff_ratio: float = 0.5, latency_factor: float = 3.0):
+        self.min_limit = min_limit
+        self.max_limit = max(min_limit, max_limit)
+        self.limit = float(min(max(initial, min_limit), self.max_limit))
+        self.backoff_ratio = backoff_ratio
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.average_latency = None
+        self._last_decrease = float('-inf')
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        """
+        Wait for a free slot and return the start time of the call.
+        """
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            return time.monotonic()
+
+    async def release(self, started: float, overloaded: bool = False):
+        """
+        Free the slot of a call started at started and adapt the limit to its outcome.
+        """
+        latency = time.monotonic() - started
+        async with self._condition:
+            self.in_flight -= 1
+            slow = self.average_latency is not None and latency > self.latency_factor * self.average_latency
+            if overloaded or slow:
+                if started > self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+                    self._last_decrease = time.monotonic()
+                    logger.info("AI SDK %s, concurrency limit lowered to %d",
+                                "overloaded" if overloaded else "latency spike", int(self.limit))
+            else:
+                slow_start = self._last_decrease == float('-inf')
+                self.limit = min(self.max_limit, self.limit + (1 if slow_start else 1 / self.limit))
+            if not overloaded:
+                self.average_latency = latency if self.average_latency is None else 0.9 * self.average_latency + 0.1 * latency
+            self._condition.notify_all()
+
+
+async def call_answer_question_api_async(client, question: str, evidence: str, api_url: str,
+                                         limiter: AIMDLimiter, pbar=None, submitted: float = None):
+    """
+    Call the Q&A API with a single question and evidence through an httpx.AsyncClient.
+
+    Args:
+    client: httpx.AsyncClient holding the credentials and connection pool
+    question: The question to answer
+    evidence: Supporting evidence to use for answering
+    api_url: API endpoint URL
+    limiter: AIMDLimiter bounding the calls in flight
+    pbar: Optional progress bar to update
+    submitted: time.monotonic() at which the call was queued, to measure its queue wait
+
+    Returns:
+    dict: JSON response from API or error dict, with the final api_status, the api_retries made,
+    the queue_wait (including the wait for the limiter) and the client_latency in seconds
+    """
+    params = _question_params(question, evidence)
+    cache_key, result = _cached_response(api_url, question, evidence)
+    if result is not None:
+        logger.debug("Using cached response for question '%s'", question)
+        if pbar:
+            pbar.update(1)
+        now = time.monotonic()
+        return _with_outcome(result, "cached", 0, submitted, now)
+    logger.debug("Full question: '%s', Evidence: '%s'", question, evidence)
+    retries = 0
+    first_started = None
+    while True:
+        pause = _CIRCUIT_BREAKER.delay()
+        if pause:
+            await asyncio.sleep(pause)
+        started = await limiter.acquire()
+        if first_started is None:
+            first_started = started
+        overloaded = False
+        retryable = False
+        retry_after = None
+        try:
+            response = await client.get(api_url, params=params)
+            overloaded = response.status_code == 429 or response.status_code >= 500
+            response.raise_for_status()
+
+            try:
+                result, status = response.json(), "ok"
+            except ValueError as json_err:
+                logger.debug("Invalid JSON response for question '%s': %s", question, json_err)
+                result = {"error": f"Invalid JSON response: {json_err}", "response_text": response.text}
+                status = "invalid JSON"
+        except httpx.HTTPError as err:
+            if isinstance(err, httpx.HTTPStatusError) and err.response.status_code == 500:
+                logger.info("Server returned a 500 error for question '%s': %s", question, err)
+            else:
+                logger.error("Error for question '%s': %s", question, err)
+            result = {"error": str(err)}
+            if isinstance(err, httpx.HTTPStatusError):
+                status = f"HTTP {err.response.status_code}"
+                retryable = err.response.status_code in AI_SDK_RETRY_STATUSES
+                retry_after = _retry_after(err.response.headers)
+            else:
+                status = type(err).__name__
+                retryable = overloaded = True
+        finally:
+            await limiter.release(started, overloaded)
+        _CIRCUIT_BREAKER.record(retryable)
+        if not retryable or retries >= AI_SDK_MAX_RETRIES:
+            break
+        retries += 1
+        delay = _retry_delay(retries, retry_after)
+        logger.info("Retrying question '%s' in %.1f s (retry %d/%d) after %s", question, delay, retries, AI_SDK_MAX_RETRIES, status)
+        await asyncio.sleep(delay)
+    _cache_response(cache_key, result)
+
+    if pbar:
+        pbar.update(1)
+
+    return _with_outcome(result, status, retries, submitted, first_started)
+
+
+async def _call_answer_question_api_all(questions, evidences, api_url, username, password, max_concurrency, on_response):
+    limiter = AIMDLimiter(initial=min(ASYNC_INITIAL_CONCURRENCY, max_concurrency), max_limit=max_concurrency)
+    limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+    async with httpx.AsyncClient(auth=(username, password), timeout=ASYNC_REQUEST_TIMEOUT, limits=limits) as client:
+        submitted = time.monotonic()
+
+        async def call(position, question, evidence):
+            response = await call_answer_question_api_async(client, question, evidence, api_url, limiter, pbar, submitted)
+            if on_response:
+                on_response(position, response)
+            return response
+
+        with tqdm(total=len(questions), desc="Making API calls") as pbar:
+            return await asyncio.gather(*(
+                call(position, question, evidence)
+                for position, (question, evidence) in enumerate(zip(questions, evidences))
+            ))
+
+
+def call_answer_question_api_multiple_async(questions, evidences, api_url: str, username: str, password: str,
+                                            max_concurrency: int = 100, on_response=None):
+    '''
+    Call the AI SDK API concurrently from an asyncio event loop, without a thread per call.
+    The calls in flight start at ASYNC_INITIAL_CONCURRENCY and are adapted by an AIMDLimiter
+    up to max_concurrency.
+    Args:
+    questions: List of questions to answer
+    evidences: List of supporting evidence for each question
+    api_url: API endpoint URL
+    username: Authentication username
+    password: Authentication password
+    max_concurrency: Maximum number of calls in flight
+    on_response: Optional callable(position, response) called as each response arrives
+
+    Returns:
+    List of JSON responses from the API, in the order of the questions
+
+    '''
+    if httpx is None:
+        raise ImportError("The asyncio AI SDK driver requires httpx (pip install httpx)")
+    try:
+        return asyncio.run(_call_answer_question_api_all(
+            questions, evidences, api_url, username, password, max(1, max_concurrency), on_response
+        ))
+    except Exception as e:
+        logger.exception("Error during API calls: %s", str(e))
+        return [{"error": str(e)}] * len(questions)
+
+
+class ResponseLog:
+    """
+    Append-only JSON Lines file of AI SDK responses, one {"index", "question", "response"}
+    record per line, written and flushed as each response arrives. Reopening the file loads
+    the responses of a previous run; the last record of an index wins and a line truncated
+    by a crash is ignored.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.responses = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                        self.responses[record["index"]] = (record["question"], record["response"])
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning("Skipping unreadable line %d of response log '%s'", line_number, path)
+            logger.info("Loaded %d responses from '%s'", len(self.responses), path)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell() > 0:
+            # Terminate a line truncated by a crash, so that it does not swallow the next record
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+        self._lock = threading.Lock()
+
+    def answered(self, index: int, question) -> bool:
+        """
+        Whether the question at index was already answered without error.
+        """
+        stored = self.responses.get(index)
+        return stored is not None and stored[0] == str(question) and "error" not in stored[1]
+
+    def response(self, index: int):
+        return self.responses[index][1]
+
+    def append(self, index: int, question, response: dict):
+        line = json.dumps({"index": index, "question": str(question), "response": response}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.responses[index] = (str(question), response)
+
+    def close(self):
+        self._file.close()
+
+
+def generate_responses(questions, evidences, api_url: str , username: str , password: str , max_workers = 10,
+                       max_concurrency = None, responses_path = None):
     '''
     Generate responses for a list of questions using the AI SDK API.
     Args:
@@ -99,25 +605,58 @@ def generate_responses(questions, evidences, api_url: str , username: str , pass
     username: Authentication username
     password: Authentication password
     max_workers: Maximum number of parallel workers
+    max_concurrency: If set, use the asyncio driver with at most this many calls in flight instead of threads
+    responses_path: Optional JSON Lines file the responses are appended to as they arrive. Questions
+        it already holds a successful response for (same index and question) are not sent again.
 
     Returns:
     List of tuples containing question, answer, SQL query, and tables used
 
     '''
+    response_log = ResponseLog(responses_path) if responses_path else None
+    pending = [i for i in range(len(questions)) if response_log is None or not response_log.answered(i, questions[i])]
+    on_response = None
+    if response_log is not None:
+        logger.info("Resuming from '%s': %d of %d questions left to send", responses_path, len(pending), len(questions))
+
+        def on_response(position, response):
+            response_log.append(pending[position], questions[pending[position]], response)
+    pending_questions = [questions[i] for i in pending]
+    pending_evidences = [evidences[i] for i in pending]
     try:
-        all_responses = call_answer_question_api_multiple(
-            questions, evidences, api_url, username, password, max_workers
-        )
+        if max_concurrency:
+            pending_responses = call_answer_question_api_multiple_async(
+                pending_questions, pending_evidences, api_url, username, password, max_concurrency, on_response
+            )
+        else:
+            pending_responses = call_answer_question_api_multiple(
+                pending_questions, pending_evidences, api_url, username, password, max_workers, on_response
+            )
     except Exception as e:
         logger.debug(f"Error calling API: {str(e)}")
         return [(question, None, None, None) for question in questions]
+    finally:
+        if response_log is not None:
+            response_log.close()
+
+    all_responses = [None] * len(questions)
+    if response_log is not None:
+        pending_indexes = set(pending)
+        for i in range(len(questions)):
+            if i not in pending_indexes:
+                # Answered by a previous run: its latencies do not belong to this run
+                all_responses[i] = {**response_log.response(i), "queue_wait": None, "client_latency": None}
+    for i, response in zip(pending, pending_responses):
+        all_responses[i] = response
 
     results = []
     for question, response_dict in tqdm(zip(questions, all_responses), desc="Processing API responses", total=len(all_responses)):
         if "error" in response_dict:
 
             logger.error("Error processing question '%s': %s", question, response_dict["error"])
-            results.append((question, None, None, None))
+            results.append((question, None, None, None, None, None, None, None,
+                            response_dict.get('api_status'), response_dict.get('api_retries'),
+                            response_dict.get('queue_wait'), response_dict.get('client_latency')))
         else:
             results.append((
                 question,
@@ -127,15 +666,105 @@ def generate_responses(questions, evidences, api_url: str , username: str , pass
                 response_dict.get('sql_execution_time'),
                 response_dict.get('vector_store_search_time'),
                 response_dict.get('llm_time'),
-                response_dict.get('total_execution_time')
+                response_dict.get('total_execution_time'),
+                response_dict.get('api_status'),
+                response_dict.get('api_retries'),
+                response_dict.get('queue_wait'),
+                response_dict.get('client_latency')
             ))
             logger.debug("Full API response: %s", json.dumps(response_dict, indent=2))
     return results
 
 
+def _percentile(sorted_values, percent):
+    # Nearest-rank percentile of an ascending list
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+def latency_histogram(values, sub_buckets: int = LATENCY_HISTOGRAM_SUB_BUCKETS, unit: float = 0.001):
+    """
+    HDR-histogram-style breakdown of latencies: buckets double in width from one unit up, and
+    each doubling is split into sub_buckets linear buckets, so the relative error is bounded
+    by 1/sub_buckets at every scale.
+
+    Returns:
+    list: [{"le": upper bound in seconds, "count": latencies in the bucket}] of the non-empty buckets
+    """
+    counts = {}
+    for value in values:
+        if value < unit:
+            bound = unit
+        else:
+            magnitude = 2 ** math.floor(math.log2(value / unit))
+            step = magnitude / sub_buckets
+            bound = (magnitude + step * (math.floor((value / unit - magnitude) / step) + 1)) * unit
+        counts[bound] = counts.get(bound, 0) + 1
+    return [{"le": round(bound, 6), "count": counts[bound]} for bound in sorted(counts)]
+
+
+def latency_report(df: pd.DataFrame, concurrency: int = None):
+    """
+    Summarize the latency of the AI SDK calls of a run, as returned by
+    generate_aisdk_responses_as_dataframe: per phase (queue_wait, client_latency and the times
+    reported by the AI SDK) the p50/p90/p99/max/mean and a latency_histogram, plus the achieved
+    throughput. Cached answers and answers resumed from a previous run are left out.
+
+    Args:
+    df: DataFrame of AI SDK responses
+    concurrency: Concurrency the run was made with, recorded in the report
+
+    Returns:
+    dict: requests, errors, elapsed seconds, qps, concurrency and phases
+    """
+    measured = df[pd.to_numeric(df["client_latency"], errors="coerce").notna()] if "client_latency" in df.columns else df.iloc[0:0]
+    if "api_status" in measured.columns:
+        measured = measured[measured["api_status"] != "cached"]
+    elapsed = 0.0
+    if len(measured):
+        # Every call of a run is queued when it starts, so the last one to finish ends the run
+        elapsed = float((pd.to_numeric(measured["queue_wait"], errors="coerce").fillna(0)
+                         + pd.to_numeric(measured["client_latency"], errors="coerce")).max())
+    phases = {}
+    for phase in LATENCY_PHASES:
+        if phase not in measured.columns:
+            continue
+        values = sorted(pd.to_numeric(measured[phase], errors="coerce").dropna().astype(float).tolist())
+        if not values:
+            continue
+        phases[phase] = {
+            "count": len(values),
+            "p50": _percentile(values, 50),
+            "p90": _percentile(values, 90),
+            "p99": _percentile(values, 99),
+            "max": values[-1],
+            "mean": sum(values) / len(values),
+            "histogram": latency_histogram(values),
+        }
+    errors = int((measured["api_status"] != "ok").sum()) if "api_status" in measured.columns else 0
+    return {
+        "requests": len(measured),
+        "errors": errors,
+        "elapsed": elapsed,
+        "qps": len(measured) / elapsed if elapsed > 0 else 0.0,
+        "concurrency": concurrency,
+        "phases": phases,
+    }
+
+
+def format_latency_report(report: dict) -> str:
+    """Render a latency_report as a text table."""
+    lines = [f"{report['requests']} AI SDK calls ({report['errors']} failed) in {report['elapsed']:.2f} s: "
+             f"{report['qps']:.2f} QPS" + (f" at concurrency {report['concurrency']}" if report['concurrency'] else ""),
+             f"{'phase':<26}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'mean':>9}"]
+    for phase, stats in report["phases"].items():
+        lines.append(f"{phase:<26}" + "".join(f"{stats[key]:>9.3f}" for key in ("p50", "p90", "p99", "max", "mean")))
+    return "\n".join(lines)
+
+
 def generate_aisdk_responses_as_dataframe(df: pd.DataFrame, question_column: str, expected_column: str , 
                                          difficulty_column: str , evidence_column: str ,
-                                         api_url: str , username: str , password: str, max_workers: int = 10, numrows: int = None):
+                                         api_url: str , username: str , password: str, max_workers: int = 10, numrows: int = None,
+                                         max_concurrency: int = None, responses_path: str = None):
     
     """
     Generate AI SDK responses and return results as a DataFrame.
@@ -149,6 +778,9 @@ def generate_aisdk_responses_as_dataframe(df: pd.DataFrame, question_column: str
         username: Authentication username
         password: Authentication password
         max_workers: Maximum number of parallel workers
+        numrows: Optional number of rows to process
+        max_concurrency: If set, use the asyncio driver with at most this many calls in flight instead of threads
+        responses_path: Optional JSON Lines file the responses are streamed to, resuming a previous run
         
     Returns:
         pd.DataFrame: DataFrame with questions, answers, and metadata
@@ -167,7 +799,7 @@ def generate_aisdk_responses_as_dataframe(df: pd.DataFrame, question_column: str
             evidences = [""] * len(df)
             
         logger.info("Generating AI SDK responses for %d questions.", len(df))
-        all_results = generate_responses(questions, evidences, api_url, username, password, max_workers)
+        all_results = generate_responses(questions, evidences, api_url, username, password, max_workers, max_concurrency, responses_path)
         if not all_results:
             logger.error("No results returned from generate_responses")
             return pd.DataFrame()
@@ -178,7 +810,7 @@ def generate_aisdk_responses_as_dataframe(df: pd.DataFrame, question_column: str
     except Exception as e:
         logger.error("Error generating responses: %s", str(e))
         return pd.DataFrame()    
-    result_df = pd.DataFrame(all_results, columns=[question_column, "Answer", "VQL Generated", "Tables Used", "sql_execution_time", "vector_store_search_time", "llm_time", "total_execution_time"])
+    result_df = pd.DataFrame(all_results, columns=[question_column, "Answer", "VQL Generated", "Tables Used", "sql_execution_time", "vector_store_search_time", "llm_time", "total_execution_time", "api_status", "api_retries", "queue_wait", "client_latency"])
     result_df["Tables Used"] = result_df["Tables Used"].astype(object)
 
     result_df['index'] = range(1, len(result_df) + 1)
@@ -188,7 +820,7 @@ def generate_aisdk_responses_as_dataframe(df: pd.DataFrame, question_column: str
         result_df[expected_column] = df[expected_column].values
         
         # Reorder columns
-        cols = ['index',question_column, "Answer", "VQL Generated", expected_column, "Tables Used", "sql_execution_time", "vector_store_search_time", "llm_time", "total_execution_time"]
+        cols = ['index',question_column, "Answer", "VQL Generated", expected_column, "Tables Used", "sql_execution_time", "vector_store_search_time", "llm_time", "total_execution_time", "api_status", "api_retries", "queue_wait", "client_latency"]
         result_df = result_df[cols]
     
     if difficulty_column and difficulty_column in df.columns:
@@ -219,8 +851,21 @@ def main():
     parser.add_argument("--rows", type=int, default=None, help="Number of rows to process (None for all)")
     parser.add_argument("--question_rows", type=int, default=None, help="Limit number of questions to send to the API")
     parser.add_argument("--evidence_column", type=str, default=None, help="Column name containing evidence/context for questions")
+    parser.add_argument("--responses_log", type=str, default=None, help="JSON Lines file the responses are appended to as they arrive; rerunning with it only sends the unanswered questions")
+    parser.add_argument("--response_cache", type=str, default=None, help="SQLite file caching successful AI SDK responses across runs (default: disabled)")
+    parser.add_argument("--response_cache_max_mb", type=float, default=RESPONSE_CACHE_MAX_BYTES / 2**20, help="Size of the response cache before least recently used answers are evicted (MB)")
+    parser.add_argument("--sdk_version", type=str, default="", help="Version of the AI SDK, part of the response cache key")
+    parser.add_argument("--refresh_response_cache", action="store_true", help="Discard the cached AI SDK responses first")
+    parser.add_argument("--api_retries", type=int, default=AI_SDK_MAX_RETRIES, help="Retries of a question after a 429/5xx response or connection error")
+    parser.add_argument("--api_backoff_factor", type=float, default=AI_SDK_BACKOFF_FACTOR, help="Base of the jittered exponential backoff between retries (seconds)")
+    parser.add_argument("--circuit_breaker_error_rate", type=float, default=CIRCUIT_BREAKER_ERROR_RATE, help="Share of failed calls that pauses all calls for a while (0 disables it)")
+    parser.add_argument("--latency_report", type=str, default=None, help="JSON file receiving the latency percentiles, throughput and histograms of the AI SDK calls")
+    parser.add_argument("--async_concurrency", type=int, default=None, help="Send the questions from an asyncio driver with adaptive concurrency, up to this many in flight (replaces --max_workers)")
 
     args = parser.parse_args()
+    configure_response_cache(args.response_cache, int(args.response_cache_max_mb * 2**20), args.sdk_version,
+                             args.refresh_response_cache)
+    configure_retries(args.api_retries, args.api_backoff_factor, args.circuit_breaker_error_rate)
     try:
         excel_kwargs = {}
         if args.sheet_name:
@@ -300,9 +945,18 @@ def main():
             api_url=args.api_url,
             username=args.api_username,
             password=args.api_password,
-            max_workers=args.max_workers
+            max_workers=args.max_workers,
+            max_concurrency=args.async_concurrency,
+            responses_path=args.responses_log
         )
         logger.info(f"Generated {len(df_responses)} responses")
+        report = latency_report(df_responses, args.async_concurrency or args.max_workers)
+        logger.info("AI SDK latency:\n%s", format_latency_report(report))
+        if args.latency_report:
+            with open(args.latency_report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if args.response_cache:
+            logger.info(f"Response cache: {response_cache_stats()}")
         
     except requests.exceptions.RequestException as e:
         logger.error(f"API request error: {str(e)}")
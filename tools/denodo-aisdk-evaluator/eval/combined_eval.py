@@ -1,11 +1,21 @@
 import argparse
 import pandas as pd
-from f1_eval import main as f1_main
-from ves_eval import main as ves_main
+from f1_eval import score_pair, failed_result, report_f1_results
+from ves_eval import results_match, time_reward, report_ves_results
 import logging
-from ai_sdk_utils import generate_aisdk_responses_as_dataframe, generate_responses
+import time
+from tqdm import tqdm
+from func_timeout import func_timeout, FunctionTimedOut
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from ai_sdk_utils import (generate_aisdk_responses_as_dataframe, generate_responses, configure_response_cache,
+                          response_cache_stats, configure_retries, latency_report, format_latency_report,
+                          RESPONSE_CACHE_MAX_BYTES, AI_SDK_MAX_RETRIES, AI_SDK_BACKOFF_FACTOR,
+                          CIRCUIT_BREAKER_ERROR_RATE)
+import json
 import numpy as np
-from db_utils import initialize_data_catalog, execute_vql 
+from db_utils import (initialize_data_catalog, execute_vql, query_cache_stats, configure_ground_truth_cache,
+                      ground_truth_cache_stats, GROUND_TRUTH_CACHE_PATH, GROUND_TRUTH_DATASET_VERSION,
+                      GROUND_TRUTH_CACHE_TTL_HOURS)
 import tempfile
 import os
 import traceback
@@ -80,7 +90,11 @@ def merge_evaluations(f1_output=None, ves_output=None, combined_output=None,
             'sql_execution_time': 'sql_execution_time',
             'vector_store_search_time': 'vector_store_search_time',
             'llm_time': 'llm_time',
-            'total_execution_time': 'total_execution_time'
+            'total_execution_time': 'total_execution_time',
+            'api_status': 'api_status',
+            'api_retries': 'api_retries',
+            'queue_wait': 'queue_wait',
+            'client_latency': 'client_latency'
         }
         
         f1_renamed = f1_details_df.rename(columns=f1_column_map)
@@ -238,7 +252,11 @@ def merge_evaluations(f1_output=None, ves_output=None, combined_output=None,
             'sql_execution_time',
             'vector_store_search_time',
             'llm_time',
-            'total_execution_time'
+            'total_execution_time',
+            'api_status',
+            'api_retries',
+            'queue_wait',
+            'client_latency'
         ]
         
         # Only include columns that actually exist in the DataFrame
@@ -281,7 +299,11 @@ def create_excel_with_visualizations(merged_details, merged_summary, output_file
         'sql_execution_time': 'Time taken to execute the SQL query',
         'vector_store_search_time': 'Time taken for vector store search',
         'llm_time': 'Time taken by the language model',
-        'total_execution_time': 'Total time taken for query execution'
+        'total_execution_time': 'Total time taken for query execution',
+        'api_status': 'Final status of the AI SDK call (ok, cached, HTTP status or connection error)',
+        'api_retries': 'Number of times the AI SDK call was retried',
+        'queue_wait': 'Seconds the AI SDK call waited for a worker or concurrency slot',
+        'client_latency': 'Seconds from sending the AI SDK call to its final answer, as observed by the client'
     }
     
     summary_descriptions = {
@@ -646,7 +668,8 @@ def add_super_header_row(details_worksheet, workbook):
         (0, 3): ('AI SDK Results and Answer', ai_sdk_format),
         (4, 7): ('Evaluation Metrics', super_header_format), 
         (8, 9): ('BIRD Bench Metrics', bird_super_header_format),
-        (10, 13): ('Timing Metrics', time_metric_format)  
+        (10, 13): ('Timing Metrics', time_metric_format),
+        (14, 17): ('AI SDK Call', ai_sdk_format)
     }
     
     for (start_col, end_col), (header_text, format_obj) in column_groups.items():
@@ -762,6 +785,120 @@ def compute_time_stats_by_group(exec_results, group_column, time_column='total_e
         'all_time_std': all_time_std
     }
 
+def evaluate_pair(predicted_vql, ground_truth_vql, db_params, idx, iterate_num, meta_time_out):
+    """
+    Executes a predicted/ground truth VQL pair once and derives every metric from the two
+    results: the F1 metrics, the same row/column count indicators and the VES correctness
+    gate. Only the VES timing iterations of matching pairs execute the queries again.
+    
+    Returns:
+    dict: sql_idx, the F1 result dict, same_row_count, same_column_count and reward
+    """
+    start_time = time.time()
+    results = []
+    for vql, ground_truth in ((predicted_vql, False), (ground_truth_vql, True)):
+        try:
+            res, exec_time = func_timeout(
+                meta_time_out,
+                execute_vql,
+                args=(str(vql), db_params),
+                kwargs={'return_time': True, 'ground_truth': ground_truth}
+            )
+        except FunctionTimedOut:
+            logger.error(f"Function timed out for index {idx}")
+            res, exec_time = None, None
+        except Exception as e:
+            logger.error(f"Error executing {'ground truth' if ground_truth else 'predicted'} VQL for index {idx}: {e}")
+            res, exec_time = None, None
+        results.append((res, exec_time))
+    (predicted_res, test_exec_time), (ground_truth_res, truth_exec_time) = results
+    executed = test_exec_time is not None and truth_exec_time is not None
+
+    if executed:
+        f1_result = score_pair(predicted_res, ground_truth_res, idx, test_exec_time, truth_exec_time)
+    else:
+        f1_result = failed_result(idx)
+
+    # Failed executions count as empty results, as in add_query_execution_data
+    pred_row_count = len(predicted_res.index) if predicted_res is not None else 0
+    pred_col_count = len(predicted_res.columns) if predicted_res is not None else 0
+    truth_row_count = len(ground_truth_res.index) if ground_truth_res is not None else 0
+    truth_col_count = len(ground_truth_res.columns) if ground_truth_res is not None else 0
+
+    reward = 0
+    if (executed and predicted_vql and ground_truth_vql and predicted_res is not None
+            and ground_truth_res is not None):
+        try:
+            if results_match(predicted_res, ground_truth_res) == 1:
+                reward = time_reward(str(predicted_vql), str(ground_truth_vql), iterate_num)
+        except Exception as e:
+            logger.error(f"Error computing VES for index {idx}: {e}")
+            reward = 0
+        if time.time() - start_time > meta_time_out:
+            logger.warning(f"Query execution timed out for index {idx}")
+            reward = 0
+
+    return {
+        "sql_idx": idx,
+        "f1": f1_result,
+        "same_row_count": 1 if pred_row_count == truth_row_count else 0,
+        "same_column_count": 1 if pred_col_count == truth_col_count else 0,
+        "reward": reward,
+    }
+
+
+def run_single_pass_evaluation(df, f1_args, ves_args):
+    """
+    Runs the F1 and VES evaluations of the AI SDK responses in one pass over the VQL pairs,
+    so that each predicted and ground truth VQL is executed once for both.
+    
+    Returns:
+    tuple: (f1_summary_df, f1_details_df, ves_summary_df, ves_details_df)
+    """
+    required_cols = [f1_args.ground_truth_col, f1_args.generated_col, f1_args.difficulty_col]
+    missing_cols = [col for col in required_cols if col not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Missing required columns: {', '.join(missing_cols)}")
+
+    db_params = {
+        "user": f1_args.user,
+        "password": f1_args.password,
+        "host": f1_args.host,
+        "port": f1_args.port,
+    }
+    vql_pairs = list(zip(df[f1_args.generated_col], df[f1_args.ground_truth_col]))
+
+    results = []
+    with ThreadPoolExecutor(max_workers=f1_args.num_cpus) as executor:
+        future_to_idx = {
+            executor.submit(evaluate_pair, predicted_vql, ground_truth_vql, db_params, i,
+                            ves_args.iterate_num, f1_args.timeout): i
+            for i, (predicted_vql, ground_truth_vql) in enumerate(vql_pairs)
+        }
+        with tqdm(total=len(vql_pairs), desc='Evaluating VQL pairs') as pbar:
+            for future in as_completed(future_to_idx):
+                idx = future_to_idx[future]
+                try:
+                    results.append(future.result())
+                except Exception as exc:
+                    logger.error(f"Query at original index {idx} generated an exception: {exc}")
+                    results.append({"sql_idx": idx, "f1": failed_result(idx), "same_row_count": 0,
+                                    "same_column_count": 0, "reward": 0})
+                finally:
+                    pbar.update(1)
+    results.sort(key=lambda x: x["sql_idx"])
+
+    df = df.copy()
+    df["same_row_count"] = [result["same_row_count"] for result in results]
+    df["same_column_count"] = [result["same_column_count"] for result in results]
+
+    f1_summary_df, f1_details_df = report_f1_results(
+        df.copy(), [result["f1"] for result in results], f1_args)
+    ves_summary_df, ves_details_df = report_ves_results(
+        df.copy(), [{"sql_idx": result["sql_idx"], "reward": result["reward"]} for result in results], ves_args)
+    return f1_summary_df, f1_details_df, ves_summary_df, ves_details_df
+
+
 def run_initialization_check(actual_api_url: str, actual_username: str, actual_password: str, path_to_excel: str, question_column:str):
     """
     Runs an initialization check by calling generate_aisdk_responses_as_dataframe for one question
@@ -883,12 +1020,26 @@ def main():
     parser.add_argument('--difficulty-col', type=str, default='difficulty', help='Column name containing difficulty level')    
     parser.add_argument('--api-url', type=str, default="http://127.0.0.1:8008/answerDataQuestion", help="AI SDK API endpoint URL")
     parser.add_argument('--max-workers', type=int, default=10, help="Max parallel workers for AI SDK calls")
+    parser.add_argument('--responses-log', type=str, default=None, help="JSON Lines file the AI SDK responses are appended to as they arrive; rerunning with it only sends the unanswered questions")
+    parser.add_argument('--response-cache', type=str, default=None, help='SQLite file caching successful AI SDK responses across runs (default: disabled)')
+    parser.add_argument('--response-cache-max-mb', type=float, default=RESPONSE_CACHE_MAX_BYTES / 2**20, help='Size of the response cache before least recently used answers are evicted (MB)')
+    parser.add_argument('--sdk-version', type=str, default='', help='Version of the AI SDK, part of the response cache key')
+    parser.add_argument('--refresh-response-cache', action='store_true', help='Discard the cached AI SDK responses first')
+    parser.add_argument('--api-retries', type=int, default=AI_SDK_MAX_RETRIES, help='Retries of an AI SDK call after a 429/5xx response or connection error')
+    parser.add_argument('--api-backoff-factor', type=float, default=AI_SDK_BACKOFF_FACTOR, help='Base of the jittered exponential backoff between AI SDK retries (seconds)')
+    parser.add_argument('--circuit-breaker-error-rate', type=float, default=CIRCUIT_BREAKER_ERROR_RATE, help='Share of failed AI SDK calls that pauses all calls for a while (0 disables it)')
+    parser.add_argument('--latency-report', type=str, default=None, help='JSON file receiving the latency percentiles, throughput and histograms of the AI SDK calls')
+    parser.add_argument('--async-concurrency', type=int, default=None, help="Send the AI SDK calls from an asyncio driver with adaptive concurrency, up to this many in flight")
     parser.add_argument('--iterate-num', type=int, default=10, help='Number of iterations for VES time comparison')
     parser.add_argument('--user', type=str, default="admin", help='Database user')
     parser.add_argument('--password', type=str, default="admin", help='Database password')
     parser.add_argument('--db-config', '-d', default=None, help='Database configuration JSON file')
     parser.add_argument('--question-rows', type=int, default=None, help='Limit number of questions to send to the API')    
     parser.add_argument('--evidence-column', type=str, default=None, help='Column name containing evidence/context for questions')
+    parser.add_argument('--ground-truth-cache', type=str, default=GROUND_TRUTH_CACHE_PATH, help='SQLite file reusing ground-truth VQL results across runs')
+    parser.add_argument('--dataset-version', type=str, default=GROUND_TRUTH_DATASET_VERSION, help='Version of the benchmark data, part of the ground-truth cache key')
+    parser.add_argument('--ground-truth-cache-ttl', type=float, default=GROUND_TRUTH_CACHE_TTL_HOURS, help='Hours a cached ground-truth result is reused (0: until invalidated)')
+    parser.add_argument('--refresh-ground-truth-cache', action='store_true', help='Discard the cached ground-truth results of the dataset version first')
     args = parser.parse_args()
     
     logging.basicConfig(level=logging.CRITICAL, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -899,8 +1050,15 @@ def main():
 
     initialize_data_catalog(
         user=args.user,
-        password=args.password
+        password=args.password,
+        pool_size=args.max_workers,
+        timeout=args.timeout
     )
+    configure_ground_truth_cache(args.ground_truth_cache, args.dataset_version,
+                                 args.ground_truth_cache_ttl, args.refresh_ground_truth_cache)
+    configure_response_cache(args.response_cache, int(args.response_cache_max_mb * 2**20), args.sdk_version,
+                             args.refresh_response_cache)
+    configure_retries(args.api_retries, args.api_backoff_factor, args.circuit_breaker_error_rate)
     
     df_input_full = pd.read_excel(args.input)
 
@@ -957,17 +1115,23 @@ def main():
                 username=args.user,
                 password=args.password,
                 max_workers=args.max_workers,
-                numrows=args.question_rows 
+                numrows=args.question_rows,
+                max_concurrency=args.async_concurrency,
+                responses_path=args.responses_log
             )
 
+        report = latency_report(df_original, args.async_concurrency or args.max_workers)
+        print(f"AI SDK latency:\n{format_latency_report(report)}")
+        if args.latency_report:
+            with open(args.latency_report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
         # Create a temporary file to save df_original
         sdk_output_fd, main_sdk_output_temp_path = tempfile.mkstemp(suffix=".xlsx")
         os.close(sdk_output_fd) 
         df_original.to_excel(main_sdk_output_temp_path, index=False)
         logger.info(f"Main AI SDK responses generated and saved to temporary file: {main_sdk_output_temp_path}")
 
-        # Run F1 evaluation
-        logger.info("\n=== Running F1 Evaluation ===")
         f1_args = argparse.Namespace(
             input=main_sdk_output_temp_path, 
             output=args.f1_output,
@@ -976,10 +1140,6 @@ def main():
             ground_truth_col=args.expected_column, generated_col="VQL Generated",
             difficulty_col=args.difficulty_col   
         )
-        f1_summary_df,f1_details_df = f1_main(f1_args)  
-        
-        # Run VES evaluation
-        logger.info("\n=== Running VES Evaluation ===")
         ves_args = argparse.Namespace(
             input=main_sdk_output_temp_path, 
             output=args.ves_output,
@@ -995,7 +1155,12 @@ def main():
             generated_col="VQL Generated",
             difficulty_col=args.difficulty_col  
         )
-        ves_summary_df, ves_details_df = ves_main(ves_args)
+
+        # Run F1 and VES evaluations, executing each VQL pair once for both
+        logger.info("\n=== Running F1 and VES Evaluation ===")
+        df_responses = pd.read_excel(main_sdk_output_temp_path)
+        f1_summary_df, f1_details_df, ves_summary_df, ves_details_df = run_single_pass_evaluation(
+            df_responses, f1_args, ves_args)
         
         merge_evaluations(args.f1_output, args.ves_output, args.output, 
                           f1_details_df=f1_details_df, ves_details_df=ves_details_df, 
@@ -1005,6 +1170,9 @@ def main():
         logger.info(f"F1 results: {args.f1_output}")
         logger.info(f"VES results: {args.ves_output}")
         logger.info(f"Combined results: {args.output}")
+        logger.info(f"VQL result cache: {query_cache_stats()}")
+        logger.info(f"Ground-truth cache: {ground_truth_cache_stats()}")
+        logger.info(f"AI SDK response cache: {response_cache_stats()}")
 
     except Exception as e:
         logger.error(f"An error occurred in the main processing: {e}")
@@ -3,9 +3,18 @@ import pandas as pd
 from tqdm import tqdm
 import requests 
 import base64
+import hashlib
+import json
+import sqlite3
 import time
 import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 logger = logging.getLogger(__name__)
 
 try:
@@ -20,10 +29,31 @@ except ValueError:
     logger.warning("DATA_CATALOG_SERVER_ID is not a valid integer. Defaulting to 1.")
     server_id_value = 1
 
+def _env_number(name, default, cast=int):
+    try:
+        return cast(os.getenv(name, default))
+    except ValueError:
+        logger.warning(f"{name} is not a valid number. Defaulting to {default}.")
+        return cast(default)
+
 DATA_CATALOG_URL = os.getenv('DATA_CATALOG_URL', 'http://localhost:9090/denodo-data-catalog').rstrip('/') + '/'
 DATA_CATALOG_EXECUTION_URL = os.getenv('DATA_CATALOG_EXECUTION_URL', "http://localhost:9090/denodo-data-catalog/public/api/askaquestion/execute")
 DATA_CATALOG_SERVER_ID = server_id_value
 DATA_CATALOG_VERIFY_SSL = os.getenv('DATA_CATALOG_VERIFY_SSL', '0').lower() == 'true' or os.getenv('DATA_CATALOG_VERIFY_SSL', '0') == '1'
+# Keep-alive connections kept open per Data Catalog host, and retries of connection errors and
+# overloaded-server responses (429/502/503/504) with exponential backoff
+DATA_CATALOG_POOL_SIZE = _env_number('DATA_CATALOG_POOL_SIZE', '10')
+DATA_CATALOG_MAX_RETRIES = _env_number('DATA_CATALOG_MAX_RETRIES', '3')
+DATA_CATALOG_BACKOFF_FACTOR = _env_number('DATA_CATALOG_BACKOFF_FACTOR', '0.5', float)
+# Seconds a VQL execution request may wait for the Data Catalog to connect or to send data
+DATA_CATALOG_TIMEOUT = _env_number('DATA_CATALOG_TIMEOUT', '30', float)
+# Memory used by the results of successful VQL executions kept for reuse (0 disables the cache)
+VQL_CACHE_MAX_BYTES = _env_number('VQL_CACHE_MAX_BYTES', str(256 * 1024 * 1024))
+# SQLite file keeping ground-truth results across runs (unset disables it), the dataset version
+# the results belong to, and their time to live in hours (0 keeps them until invalidated)
+GROUND_TRUTH_CACHE_PATH = os.getenv('GROUND_TRUTH_CACHE_PATH') or None
+GROUND_TRUTH_DATASET_VERSION = os.getenv('GROUND_TRUTH_DATASET_VERSION', '')
+GROUND_TRUTH_CACHE_TTL_HOURS = _env_number('GROUND_TRUTH_CACHE_TTL_HOURS', '0', float)
 
 
 EXECUTE_VQL_LIMIT = 100
@@ -34,8 +64,248 @@ _DATA_CATALOG_CONFIG = {
     'server_id': DATA_CATALOG_SERVER_ID,
     'verify_ssl': DATA_CATALOG_VERIFY_SSL
 }
+_SESSION = None
+_TIMING_SESSION = None
+_SESSION_LOCK = threading.RLock()
+_REQUEST_TIMEOUT = DATA_CATALOG_TIMEOUT
+
+def configure_session(pool_size=None, max_retries=None, backoff_factor=None, timeout=None):
+    """
+    Create the shared HTTP sessions used by execute_vql, replacing the previous ones.
+    Connections are kept alive and reused across calls and threads instead of opening
+    a new TCP/TLS connection per query. Timed executions get a session of their own that
+    never retries, so no backoff delay ends up in a measured time.
+    
+    Args:
+        pool_size (int, optional): Maximum connections per host, usually the number of worker threads.
+            Threads beyond it wait for a free connection, at most until a request times out.
+        max_retries (int, optional): Retries of connection errors and 429/502/503/504 responses.
+            Requests that timed out waiting for data are not sent again.
+        backoff_factor (float, optional): Base of the exponential backoff between retries, in seconds
+        timeout (float, optional): Seconds each request may wait to connect or for data, usually
+            the query timeout of the evaluation
+    
+    Returns:
+        requests.Session: The new shared session
+    """
+    global _SESSION, _TIMING_SESSION, _REQUEST_TIMEOUT
+    pool_size = pool_size or DATA_CATALOG_POOL_SIZE
+    retry = Retry(
+        total=DATA_CATALOG_MAX_RETRIES if max_retries is None else max_retries,
+        # A query that ran into the timeout would most likely run into it again
+        read=0,
+        backoff_factor=DATA_CATALOG_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+        status_forcelist=(429, 502, 503, 504),
+        # VQL executions are read-only queries, so retrying the POST is safe
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    session = _pooled_session(pool_size, retry)
+    timing_session = _pooled_session(pool_size, Retry(total=0, raise_on_status=False))
+    with _SESSION_LOCK:
+        previous = (_SESSION, _TIMING_SESSION)
+        _SESSION, _TIMING_SESSION = session, timing_session
+        _REQUEST_TIMEOUT = DATA_CATALOG_TIMEOUT if timeout is None else timeout
+    for previous_session in previous:
+        if previous_session is not None:
+            previous_session.close()
+    logger.info(f"Data Catalog session configured with {pool_size} connections per host")
+    return session
+
+def _pooled_session(pool_size, retry):
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_session(retry=True):
+    """Return the shared HTTP session, or the one that never retries for timed executions,
+    creating them with the default settings on first use."""
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            configure_session()
+        return _SESSION if retry else _TIMING_SESSION
+
+class QueryResultCache:
+    """
+    Thread-safe LRU cache of VQL results, bounded by the memory used by the cached DataFrames.
+    """
+    def __init__(self, max_bytes=VQL_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return a copy of the cached (DataFrame, execution_time) for key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        df, execution_time, _ = entry
+        return df.copy(), execution_time
 
-def initialize_data_catalog(user, password, url=None, execution_url=None, server_id=None, verify_ssl=None):
+    def put(self, key, df, execution_time):
+        nbytes = int(df.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[2]
+            self.entries[key] = (df.copy(), execution_time, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, _, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.size}
+
+_QUERY_CACHE = QueryResultCache()
+
+class GroundTruthCache:
+    """
+    On-disk cache of ground-truth VQL results in a SQLite file, so repeated evaluations of the
+    same benchmark only execute the generated queries. Entries are keyed by the hash of the
+    normalized query and its execution settings, and belong to a dataset version: results of
+    other versions are never returned.
+    """
+    def __init__(self, path, dataset_version='', ttl_hours=0):
+        self.path = path
+        self.dataset_version = dataset_version
+        self.ttl = ttl_hours * 3600
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ground_truth_results ("
+            "key TEXT PRIMARY KEY, dataset_version TEXT, vql TEXT, rows TEXT, execution_time REAL, created REAL)")
+        self.conn.commit()
+
+    def make_key(self, *parts):
+        return hashlib.sha256(json.dumps([self.dataset_version, *parts]).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return (parsed rows, execution_time) for key, or None if missing or expired."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT rows, execution_time, created FROM ground_truth_results WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and time.time() - row[2] > self.ttl:
+                self.conn.execute("DELETE FROM ground_truth_results WHERE key = ?", (key,))
+                self.conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), row[1]
+
+    def put(self, key, vql, parsed_rows, execution_time):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO ground_truth_results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.dataset_version, vql, json.dumps(parsed_rows), execution_time, time.time()))
+            self.conn.commit()
+
+    def invalidate(self, dataset_version=None):
+        """
+        Delete the cached results of dataset_version, or all of them if it is None.
+        
+        Returns:
+            int: Number of deleted results
+        """
+        with self.lock:
+            if dataset_version is None:
+                deleted = self.conn.execute("DELETE FROM ground_truth_results").rowcount
+            else:
+                deleted = self.conn.execute(
+                    "DELETE FROM ground_truth_results WHERE dataset_version = ?", (dataset_version,)).rowcount
+            self.conn.commit()
+        return deleted
+
+    def purge_expired(self):
+        """Delete the results older than the time to live. Returns the number of deleted results."""
+        if not self.ttl:
+            return 0
+        with self.lock:
+            deleted = self.conn.execute(
+                "DELETE FROM ground_truth_results WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            self.conn.commit()
+        return deleted
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute(
+                "SELECT COUNT(*) FROM ground_truth_results WHERE dataset_version = ?", (self.dataset_version,)).fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'dataset_version': self.dataset_version}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_GROUND_TRUTH_CACHE = None
+
+def configure_ground_truth_cache(path=GROUND_TRUTH_CACHE_PATH, dataset_version=GROUND_TRUTH_DATASET_VERSION,
+                                 ttl_hours=GROUND_TRUTH_CACHE_TTL_HOURS, refresh=False):
+    """
+    Enable the on-disk ground-truth result cache used by execute_vql(..., ground_truth=True).
+    
+    Args:
+        path (str): SQLite file holding the cache, or None to disable it
+        dataset_version (str): Version of the benchmark data the ground-truth results belong to
+        ttl_hours (float): Hours a cached result is reused, 0 to keep it until invalidated
+        refresh (bool): Delete the cached results of dataset_version first
+    
+    Returns:
+        GroundTruthCache or None
+    """
+    global _GROUND_TRUTH_CACHE
+    if _GROUND_TRUTH_CACHE is not None:
+        _GROUND_TRUTH_CACHE.close()
+    _GROUND_TRUTH_CACHE = GroundTruthCache(path, dataset_version, ttl_hours) if path else None
+    if _GROUND_TRUTH_CACHE is not None:
+        deleted = _GROUND_TRUTH_CACHE.purge_expired()
+        if refresh:
+            deleted += _GROUND_TRUTH_CACHE.invalidate(dataset_version)
+        logger.info(f"Ground-truth cache {path} (dataset version '{dataset_version}'): {deleted} results deleted")
+    return _GROUND_TRUTH_CACHE
+
+def ground_truth_cache_stats():
+    """Return the hit/miss counters of the ground-truth cache, or None if it is disabled."""
+    return _GROUND_TRUTH_CACHE.stats() if _GROUND_TRUTH_CACHE is not None else None
+
+def normalize_vql(vql):
+    """
+    Normalize a VQL query for use as a cache key: whitespace is collapsed and keywords and
+    identifiers are lowercased, while quoted literals and identifiers are kept as written.
+    """
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", str(vql))
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', parts[i]).lower()
+    return ''.join(parts).strip().rstrip(';').strip()
+
+def query_cache_stats():
+    """Return the hit/miss counters and size of the VQL result cache."""
+    return _QUERY_CACHE.stats()
+
+def clear_query_cache():
+    _QUERY_CACHE.clear()
+
+def initialize_data_catalog(user, password, url=None, execution_url=None, server_id=None, verify_ssl=None,
+                            pool_size=None, max_retries=None, timeout=None):
     """
     Initialize Data Catalog configuration and store credentials for reuse.
     Call this once at the beginning of your program.
@@ -47,6 +317,9 @@ def initialize_data_catalog(user, password, url=None, execution_url=None, server
         execution_url (str, optional): Execution URL endpoint
         server_id (int, optional): Server ID
         verify_ssl (bool, optional): Whether to verify SSL certificates
+        pool_size (int, optional): Connections kept open to the Data Catalog, usually the number of workers
+        max_retries (int, optional): Retries of connection errors and overloaded-server responses
+        timeout (float, optional): Seconds each VQL execution request may wait to connect or for data
     """
     global _AUTH_CREDENTIALS, _DATA_CATALOG_CONFIG
     
@@ -64,6 +337,7 @@ def initialize_data_catalog(user, password, url=None, execution_url=None, server
         _DATA_CATALOG_CONFIG['server_id'] = server_id
     if verify_ssl is not None:
         _DATA_CATALOG_CONFIG['verify_ssl'] = verify_ssl
+    configure_session(pool_size=pool_size, max_retries=max_retries, timeout=timeout)
     
     logger.info(f"Data Catalog initialized with execution URL: {_DATA_CATALOG_CONFIG['execution_url']}")
 
@@ -106,10 +380,15 @@ def calculate_basic_auth_authorization_header(user, password):
     return 'Basic' + ' ' + base64.b64encode(ascii_bytes).decode('utf-8')
     
 def execute_vql(vql, db_params=None, return_time=False, limit=EXECUTE_VQL_LIMIT, 
-                execution_url=None, server_id=None, verify_ssl=None):
+                execution_url=None, server_id=None, verify_ssl=None, use_cache=True, ground_truth=False,
+                retry=True):
     """
     Execute VQL against Data Catalog with support for OAuth token or Basic auth.
     Uses stored credentials if no db_params provided.
+    Successful results are cached by normalized VQL, limit, server and user, and a cached
+    result is returned with the execution time measured when it was fetched. Pass
+    use_cache=False and retry=False when the execution itself is being measured. Ground-truth queries can
+    also be reused across runs through the on-disk ground-truth cache, if configured.
     
     Args:
         vql: VQL query to execute
@@ -119,6 +398,9 @@ def execute_vql(vql, db_params=None, return_time=False, limit=EXECUTE_VQL_LIMIT,
         execution_url: Data Catalog execution endpoint (optional, uses stored value if None)
         server_id: Server identifier (optional, uses stored value if None)
         verify_ssl: Whether to verify SSL certificates (optional, uses stored value if None)
+        use_cache: Whether to reuse and store results in the VQL result cache
+        ground_truth: Whether the query is a ground-truth query, kept in the ground-truth cache
+        retry: Whether to retry connection errors and overloaded-server responses
         
     Returns:
         pd.DataFrame or tuple (pd.DataFrame, execution_time)
@@ -141,6 +423,24 @@ def execute_vql(vql, db_params=None, return_time=False, limit=EXECUTE_VQL_LIMIT,
     actual_server_id = server_id or _DATA_CATALOG_CONFIG['server_id']
     actual_verify_ssl = verify_ssl if verify_ssl is not None else _DATA_CATALOG_CONFIG['verify_ssl']
     
+    memory_cache = use_cache and _QUERY_CACHE.max_bytes > 0
+    ground_truth_cache = _GROUND_TRUTH_CACHE if use_cache and ground_truth else None
+    if memory_cache or ground_truth_cache is not None:
+        cache_key = (normalize_vql(vql), limit, actual_execution_url, actual_server_id, auth[0])
+    if memory_cache:
+        cached = _QUERY_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
+    if ground_truth_cache is not None:
+        ground_truth_key = ground_truth_cache.make_key(*cache_key)
+        stored = ground_truth_cache.get(ground_truth_key)
+        if stored is not None:
+            parsed_rows, execution_time = stored
+            df = pd.DataFrame(parsed_rows) if parsed_rows else pd.DataFrame()
+            if memory_cache:
+                _QUERY_CACHE.put(cache_key, df, execution_time)
+            return df, execution_time
+    
     logging.info("Preparing execution request")
     headers = {
         'Content-Type': 'application/json',
@@ -153,11 +453,12 @@ def execute_vql(vql, db_params=None, return_time=False, limit=EXECUTE_VQL_LIMIT,
     }
     
     try:
-        response = requests.post(
+        response = get_session(retry).post(
             f"{actual_execution_url}?serverId={actual_server_id}",
             json=data,
             headers=headers,
-            verify=actual_verify_ssl
+            verify=actual_verify_ssl,
+            timeout=_REQUEST_TIMEOUT
         )
         response.raise_for_status()
 
@@ -168,6 +469,10 @@ def execute_vql(vql, db_params=None, return_time=False, limit=EXECUTE_VQL_LIMIT,
         df = pd.DataFrame(parsed_rows) if parsed_rows else pd.DataFrame()
         
         execution_time = time.time() - start_time
+        if memory_cache:
+            _QUERY_CACHE.put(cache_key, df, execution_time)
+        if ground_truth_cache is not None:
+            ground_truth_cache.put(ground_truth_key, vql, parsed_rows, execution_time)
         
         return df, execution_time
 
@@ -186,16 +491,52 @@ def execute_vql(vql, db_params=None, return_time=False, limit=EXECUTE_VQL_LIMIT,
 
 
 
-def add_query_execution_data(df, datacatalog_params, expected_column, predicted_column="VQL Generated"):
+def _same_structure(index, predicted_sql, ground_truth_sql, datacatalog_params):
+    """
+    Execute a predicted and a ground truth VQL and compare their row and column counts.
+    Failed executions count as empty results.
+    
+    Returns:
+        tuple: (same_row_count, same_column_count) binary indicators
+    """
+    # Execute predicted SQL
+    try:
+        pred_data, _ = execute_vql(predicted_sql, datacatalog_params, return_time=True)
+        pred_row_count = len(pred_data.index) if pred_data is not None else 0
+        pred_col_count = len(pred_data.columns) if pred_data is not None else 0
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logging.error("Error executing predicted VQL on row %d: %s", index, str(e))
+        pred_row_count = 0
+        pred_col_count = 0
+    
+    # Execute ground truth SQL
+    try:
+        truth_data, _ = execute_vql(ground_truth_sql, datacatalog_params, return_time=True, ground_truth=True)
+        truth_row_count = len(truth_data.index) if truth_data is not None else 0
+        truth_col_count = len(truth_data.columns) if truth_data is not None else 0
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logging.error("Error executing ground truth VQL on row %d: %s", index, str(e))
+        truth_row_count = 0
+        truth_col_count = 0
+    
+    # Check if row and column counts match
+    same_row = 1 if pred_row_count == truth_row_count else 0
+    same_col = 1 if pred_col_count == truth_col_count else 0
+    return same_row, same_col
+
+def add_query_execution_data(df, datacatalog_params, expected_column, predicted_column="VQL Generated",
+                             max_workers=None):
     """
     For each row in the DataFrame, execute the predicted VQL and the ground truth VQL 
     and check if they return the same number of rows and columns.
+    Rows are processed concurrently by a bounded pool of worker threads.
     
     Parameters:
         df (pd.DataFrame): DataFrame containing VQL queries
         datacatalog_params (dict): Database connection parameters
         expected_column (str): Column name containing ground truth VQL queries
         predicted_column (str, optional): Column name containing predicted VQL queries. Defaults to "VQL Generated".
+        max_workers (int, optional): Rows executed concurrently. Defaults to DATA_CATALOG_POOL_SIZE.
     
     New columns added:
       - same_row_count: Binary indicator (1 if predicted and truth have same row count)
@@ -204,43 +545,28 @@ def add_query_execution_data(df, datacatalog_params, expected_column, predicted_
     Returns:
       pd.DataFrame: Modified DataFrame with structural matching indicators
     """
-    same_row_counts = []
-    same_column_counts = []
+    max_workers = max(1, max_workers or DATA_CATALOG_POOL_SIZE)
+    results = [(0, 0)] * len(df)
     
-    for index, row in tqdm(df.iterrows(), total=len(df), desc="Executing VQL queries", position=0, leave=True):
-        predicted_sql = row[predicted_column]
-        ground_truth_sql = row[expected_column]
-        
-        # Execute predicted SQL
-        try:
-            pred_data, _ = execute_vql(predicted_sql, datacatalog_params, return_time=True)
-            pred_row_count = len(pred_data.index) if pred_data is not None else 0
-            pred_col_count = len(pred_data.columns) if pred_data is not None else 0
-        except (requests.RequestException, ValueError, KeyError) as e:
-            logging.error("Error executing predicted VQL on row %d: %s", index, str(e))
-            pred_row_count = 0
-            pred_col_count = 0
-        
-        # Execute ground truth SQL
-        try:
-            truth_data, _ = execute_vql(ground_truth_sql, datacatalog_params, return_time=True)
-            truth_row_count = len(truth_data.index) if truth_data is not None else 0
-            truth_col_count = len(truth_data.columns) if truth_data is not None else 0
-        except (requests.RequestException, ValueError, KeyError) as e:
-            logging.error("Error executing ground truth VQL on row %d: %s", index, str(e))
-            truth_row_count = 0
-            truth_col_count = 0
-        
-        # Check if row and column counts match
-        same_row = 1 if pred_row_count == truth_row_count else 0
-
-        same_col = 1 if pred_col_count == truth_col_count else 0
-        
-        same_row_counts.append(same_row)
-        same_column_counts.append(same_col)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Results are stored by position, errors are reported with the DataFrame index like _same_structure
+        future_to_row = {
+            executor.submit(_same_structure, index, row[predicted_column], row[expected_column],
+                            datacatalog_params): (position, index)
+            for position, (index, row) in enumerate(df.iterrows())
+        }
+        with tqdm(total=len(df), desc="Executing VQL queries", position=0, leave=True) as pbar:
+            for future in as_completed(future_to_row):
+                position, index = future_to_row[future]
+                try:
+                    results[position] = future.result()
+                except Exception as e:
+                    logging.error("Error comparing VQL results on row %d: %s", index, str(e))
+                finally:
+                    pbar.update(1)
     
-    # Add only the binary indicators to the DataFrame
-    df["same_row_count"] = same_row_counts
-    df["same_column_count"] = same_column_counts
+    # Add only the binary indicators to the DataFrame, in row order
+    df["same_row_count"] = [same_row for same_row, _ in results]
+    df["same_column_count"] = [same_col for _, same_col in results]
     
     return df
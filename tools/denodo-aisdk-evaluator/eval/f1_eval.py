@@ -4,7 +4,7 @@ import multiprocessing as mp
 import pandas as pd
 from tqdm import tqdm
 from func_timeout import func_timeout, FunctionTimedOut
-from db_utils import execute_vql, add_query_execution_data
+from db_utils import execute_vql, add_query_execution_data, configure_session
 import logging
 import numpy as np
 from  collections import Counter
@@ -166,6 +166,70 @@ def percent_overlapp(ground_truth_res, predicted_res):
     return percent_overlap*100
 
 
+def score_pair(predicted_res, ground_truth_res, idx, test_exec_time=0.0, truth_exec_time=0.0):
+    """
+    Calculate the F1 metrics of an executed query pair.
+    
+    Args:
+    predicted_res: Result DataFrame of the predicted query
+    ground_truth_res: Result DataFrame of the ground truth query
+    idx: Index for tracking
+    test_exec_time: Execution time of the predicted query
+    truth_exec_time: Execution time of the ground truth query
+    
+    Returns:
+    dict: Result with SQL index, F1 score and additional metrics
+    """
+    test_row_counts = len(predicted_res) if predicted_res is not None else 0
+    test_column_counts = len(predicted_res.columns) if predicted_res is not None else 0
+    truth_row_counts = len(ground_truth_res) if ground_truth_res is not None else 0
+    truth_column_counts = len(ground_truth_res.columns) if ground_truth_res is not None else 0
+    # Compute enhanced F1 score with the new function - corrected argument order
+    f1_val, percent_match, set_precision, all_matches, all_set_matches = f1_score(predicted_res, ground_truth_res)
+    
+    # Also compute original F1 score
+    precision = percent_overlapp(ground_truth_res, predicted_res)  
+    logger.info(f"F1 score for index {idx}: {f1_val}, original F1:, match: {percent_match}%")
+    
+    # Result with metrics including the new match details
+    return {
+        "sql_idx": idx, 
+        "res": f1_val, 
+        'percent_match': percent_match,
+        'precision': precision,
+        'set_precision': set_precision,
+        'all_matches': all_matches,
+        'all_set_matches': all_set_matches,
+        'test_exec_time': test_exec_time,
+        'test_row_counts': test_row_counts,
+        'test_column_counts': test_column_counts,
+        'truth_exec_time': truth_exec_time,
+        'truth_row_counts': truth_row_counts,
+        'truth_column_counts': truth_column_counts,
+    }
+
+
+def failed_result(idx):
+    """
+    Result of a query pair that timed out or failed to execute (F1=0).
+    """
+    return {
+        "sql_idx": idx, 
+        "res": 0.0, 
+        'percent_match': 0.0,
+        'precision': 0.0,
+        'set_precision': 0.0,
+        'all_matches': [],
+        'all_set_matches': [],
+        'test_exec_time': 0.0,
+        'test_row_counts': 0,
+        'test_column_counts': 0,
+        'truth_exec_time': 0.0,
+        'truth_row_counts': 0,
+        'truth_column_counts': 0,
+    }
+
+
 def execute_model(predicted_vql, ground_truth_vql, db_params, idx, meta_time_out):
     """
     Execute both queries and calculate F1 score.
@@ -208,8 +272,6 @@ def execute_model(predicted_vql, ground_truth_vql, db_params, idx, meta_time_out
             args=(str_predicted_vql, db_params),
             kwargs={'return_time': True}
         )
-        test_row_counts = len(predicted_res) if predicted_res is not None else 0
-        test_column_counts = len(predicted_res.columns) if predicted_res is not None else 0
 
         # Ensure VQL is a string
         str_ground_truth_vql = str(ground_truth_vql)
@@ -217,73 +279,21 @@ def execute_model(predicted_vql, ground_truth_vql, db_params, idx, meta_time_out
             meta_time_out,
             execute_vql,
             args=(str_ground_truth_vql, db_params),
-            kwargs={'return_time': True}
+            kwargs={'return_time': True, 'ground_truth': True}
         )
-        truth_row_counts = len(ground_truth_res) if ground_truth_res is not None else 0
-        truth_column_counts = len(ground_truth_res.columns) if ground_truth_res is not None else 0
-        # Compute enhanced F1 score with the new function - corrected argument order
-        f1_val, percent_match, set_precision, all_matches, all_set_matches = f1_score(predicted_res, ground_truth_res)
-        
-        # Also compute original F1 score
-        precision = percent_overlapp(ground_truth_res, predicted_res)  
-        logger.info(f"F1 score for index {idx}: {f1_val}, original F1:, match: {percent_match}%")
-        
-        # Update result with metrics including the new match details
-        result = {
-            "sql_idx": idx, 
-            "res": f1_val, 
-            'percent_match': percent_match,
-            'precision': precision,
-            'set_precision': set_precision,
-            'all_matches': all_matches,
-            'all_set_matches': all_set_matches,
-            'test_exec_time': test_exec_time,
-            'test_row_counts': test_row_counts,
-            'test_column_counts': test_column_counts,
-            'truth_exec_time': truth_exec_time,
-            'truth_row_counts': truth_row_counts,
-            'truth_column_counts': truth_column_counts,
-        }
+        result = score_pair(predicted_res, ground_truth_res, idx, test_exec_time, truth_exec_time)
 
     except KeyboardInterrupt:
         sys.exit(0)
     except FunctionTimedOut:
         # If timed out, we set F1=0
         logger.error(f"Function timed out for index {idx}")
-        result = {
-            "sql_idx": idx, 
-            "res": 0.0, 
-            'percent_match': 0.0,
-            'precision': 0.0,
-            'set_precision': 0.0,
-            'all_matches': [],
-            'all_set_matches': [],
-            'test_exec_time': 0.0,
-            'test_row_counts': 0,
-            'test_column_counts': 0,
-            'truth_exec_time': 0.0,
-            'truth_row_counts': 0,
-            'truth_column_counts': 0,
-        }
+        result = failed_result(idx)
    
     except Exception as e:
         # On error, set F1=0
         logger.error(f"Error executing model for index {idx}: {e}")
-        result = {
-            "sql_idx": idx, 
-            "res": 0.0, 
-            'percent_match': 0.0,
-            'precision': 0.0,
-            'set_precision': 0.0,
-            'all_matches': [],
-            'all_set_matches': [],
-            'test_exec_time': 0.0,
-            'test_row_counts': 0,
-            'test_column_counts': 0,
-            'truth_exec_time': 0.0,
-            'truth_row_counts': 0,
-            'truth_column_counts': 0,
-        }
+        result = failed_result(idx)
 
     return result
 
@@ -502,6 +512,8 @@ def main(args=None):
         parser.add_argument('--difficulty-col', '-c', default='difficulty',help='Column name containing difficulty level (default: difficulty)')
         
         args = parser.parse_args()
+        # Keep one open Data Catalog connection per worker thread
+        configure_session(pool_size=args.num_cpus, timeout=args.timeout)
     
     # Configure logging
     logging.basicConfig(level=logging.INFO)
@@ -522,15 +534,8 @@ def main(args=None):
         logger.error(f"Missing required columns: {', '.join(missing_cols)}")
         sys.exit(1)
     
-    # Extract VQL pairs and difficulties using specified column names
+    # Extract VQL pairs using specified column names
     vql_pairs = list(zip(df[args.generated_col], df[args.ground_truth_col]))
-    difficulties = df[args.difficulty_col].tolist()
-
-    if 'index' in df.columns:
-        original_indexes = df['index'].tolist()
-    else:
-        # If there's no explicit index column, use the DataFrame index
-        original_indexes = df.index.tolist()
 
         # Use individual connection parameters
     db_params = {
@@ -539,13 +544,37 @@ def main(args=None):
         "host": args.host,
         "port": args.port,
     }
-    df = add_query_execution_data(df, db_params, args.ground_truth_col, args.generated_col)
+    df = add_query_execution_data(df, db_params, args.ground_truth_col, args.generated_col,
+                                  max_workers=args.num_cpus)
 
     db_params_list = [db_params] * len(vql_pairs)
     
     # Run F1 score calculation
     logger.info(f"Calculating F1 scores for {len(vql_pairs)} query pairs...")
     results = run_sqls_parallel(vql_pairs, db_params_list, args.num_cpus, args.timeout)
+    return report_f1_results(df, results, args)
+
+
+def report_f1_results(df, results, args):
+    """
+    Build the F1 summary and details from the per-query results of run_sqls_parallel,
+    print the summary and write them to args.output if set.
+    
+    Args:
+    df: Evaluated DataFrame, with the same_row_count/same_column_count indicators
+    results: List of per-query result dicts, as returned by execute_model
+    args: Namespace with the output path and column names of f1_eval
+    
+    Returns:
+    tuple: (summary DataFrame, details DataFrame), each with a description row
+    """
+    vql_pairs = list(zip(df[args.generated_col], df[args.ground_truth_col]))
+    difficulties = df[args.difficulty_col].tolist()
+    if 'index' in df.columns:
+        original_indexes = df['index'].tolist()
+    else:
+        original_indexes = df.index.tolist()
+
     results = sorted(results, key=lambda x: x["sql_idx"])
     # Add difficulty to results
     for result in results:
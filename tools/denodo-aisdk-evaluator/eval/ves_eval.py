@@ -7,7 +7,7 @@ import argparse
 import pandas as pd
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from db_utils import execute_vql, add_query_execution_data
+from db_utils import execute_vql, add_query_execution_data, configure_session
 import logging
 
 logger = logging.getLogger(__name__)
@@ -51,6 +51,29 @@ def normalize_value(val):
     else:
         return str(val)
 
+def results_match(generated_df, gt_df):
+    """
+    Compares the results of a generated and a ground truth query.
+    
+    Parameters:
+    generated_df (pd.DataFrame): Result of the generated query
+    gt_df (pd.DataFrame): Result of the ground truth query
+    
+    Returns:
+    int: 1 if results match perfectly, 0 otherwise
+    """
+    # If both empty, that's a match
+    if len(generated_df) == 0 and len(gt_df) == 0:
+        return 1
+    # Convert to sets of tuple column names
+    ground_truth_res = set(tuple(row) for row in gt_df.values)
+    predicted_res = set(tuple(row) for row in generated_df.values)
+    
+    if list(predicted_res) == list(ground_truth_res):
+        logger.info("Perfect match - all ground truth cells matched, no extra values")
+        return 1
+    return 0
+
 def compare_vql_execution(generated_vql, ground_truth, datacatalog_params):
     """
     Executes both generated and ground truth VQL queries and compares their results.
@@ -82,7 +105,7 @@ def compare_vql_execution(generated_vql, ground_truth, datacatalog_params):
         
         # Try to execute ground truth query
         try:
-            gt_df, _ = execute_vql(ground_truth, return_time=True)
+            gt_df, _ = execute_vql(ground_truth, return_time=True, ground_truth=True)
             if gt_df is None:
                 logger.warning(f"Attempt {attempt}: Ground truth query returned None results")
                 continue
@@ -91,27 +114,8 @@ def compare_vql_execution(generated_vql, ground_truth, datacatalog_params):
             logger.error(f"Attempt {attempt}: Error executing ground truth VQL: {e}")
             continue
         
-        # If both empty, that's a match
-        if len(generated_df) == 0 and len(gt_df) == 0:
-            return 1
-        
         try:
-            # First compare shapes
-            gt_shape = gt_df.shape
-            generated_shape = generated_df.shape            
-            # If both empty, that's a match
-            if gt_shape[0] == 0 and generated_shape[0] == 0:
-                return 1
-            # Convert to sets of tuple column names
-            ground_truth_res = set(tuple(row) for row in gt_df.values)
-            predicted_res = set(tuple(row) for row in generated_df.values)
-            
-            if list(predicted_res) == list(ground_truth_res):
-                logger.info(f"Attempt {attempt}: Perfect match - all ground truth cells matched, no extra values")
-                return 1
-            else:
-                return 0
-                
+            return results_match(generated_df, gt_df)
         except Exception as e:
             logger.error(f"Attempt {attempt}: Error comparing result sets: {e}")
     
@@ -132,37 +136,51 @@ def iterated_execute_vql(predicted_vql, ground_truth, datacatalog_params, iterat
     Returns:
     float: The computed reward based on execution time.
     """
-    diff_list = []
-    
     # Log the database connection parameters for debugging
     logger.debug(f"Database connection parameters: {json.dumps(datacatalog_params, default=str)}")
     
-    reward = 0
-    time_ratio = 0
-
     sql_exec_bool = compare_vql_execution(predicted_vql, ground_truth, datacatalog_params) == 1
     if sql_exec_bool == 1:
         logger.info("Results match, proceeding with time comparison")
-        for i in range(iterate_num):
-            logger.debug("Iteration %d/%d", i+1, iterate_num)
-            # Measure predicted query time
-            try:
-                _, predicted_time = execute_vql(predicted_vql)
-            except Exception as e:
-                logger.error("Error executing predicted SQL in iteration %d: %r", i+1, e)
-                continue
-            # Measure ground truth query time
-            try:
-                _, ground_truth_time = execute_vql(ground_truth)
-            except Exception as e:
-                logger.error("Error executing ground truth SQL in iteration %d: %r", i+1, e)
-                continue
-            diff_list.append(ground_truth_time / predicted_time)
-        processed_diff_list = clean_abnormal(diff_list)
-        time_ratio = sum(processed_diff_list) / len(processed_diff_list)
+        return time_reward(predicted_vql, ground_truth, iterate_num)
     else:
         logger.warning("Results do not match, skipping time comparison")
         return 0
+
+
+def time_reward(predicted_vql, ground_truth, iterate_num):
+    """
+    Times the predicted and ground truth queries, bypassing the result caches and retries, and maps
+    the mean time ratio to a reward.
+    
+    Parameters:
+    predicted_vql (str): The predicted VQL query.
+    ground_truth (str): The ground truth VQL query.
+    iterate_num (int): Number of iterations to execute the queries.
+    
+    Returns:
+    float: The computed reward based on execution time.
+    """
+    diff_list = []
+    reward = 0
+    time_ratio = 0
+    for i in range(iterate_num):
+        logger.debug("Iteration %d/%d", i+1, iterate_num)
+        # Measure predicted query time
+        try:
+            _, predicted_time = execute_vql(predicted_vql, use_cache=False, retry=False)
+        except Exception as e:
+            logger.error("Error executing predicted SQL in iteration %d: %r", i+1, e)
+            continue
+        # Measure ground truth query time
+        try:
+            _, ground_truth_time = execute_vql(ground_truth, use_cache=False, retry=False)
+        except Exception as e:
+            logger.error("Error executing ground truth SQL in iteration %d: %r", i+1, e)
+            continue
+        diff_list.append(ground_truth_time / predicted_time)
+    processed_diff_list = clean_abnormal(diff_list)
+    time_ratio = sum(processed_diff_list) / len(processed_diff_list)
     
     if time_ratio == 0:
         reward = 0
@@ -360,6 +378,8 @@ def main(args=None):
                             help='Column name containing difficulty level (default: difficulty)')
         
         args = parser.parse_args()
+        # Keep one open Data Catalog connection per worker thread
+        configure_session(pool_size=args.num_cpus, timeout=args.timeout)
         
     # Configure logging
     logging.basicConfig(level=logging.CRITICAL)    
@@ -379,10 +399,6 @@ def main(args=None):
     
     # Extract VQL pairs
     vql_pairs = list(zip(df[args.generated_col], df[args.ground_truth_col]))
-    if 'index' in df.columns:
-        original_indexes = df['index'].tolist()
-    else:
-        original_indexes = df.index.tolist()
     # Set up database parameters
     if args.db_config:
         # Use database config file if provided
@@ -404,7 +420,8 @@ def main(args=None):
     db_params_list = [db_params] * len(vql_pairs)
     
     # Process with add_query_execution_data to get binary match indicators
-    df = add_query_execution_data(df, db_params, args.ground_truth_col, args.generated_col)
+    df = add_query_execution_data(df, db_params, args.ground_truth_col, args.generated_col,
+                                  max_workers=args.num_cpus)
     
     # Run VES calculation
     results = run_sqls_parallel(
@@ -414,6 +431,26 @@ def main(args=None):
         iterate_num=args.iterate_num, 
         meta_time_out=args.timeout, 
     )
+    return report_ves_results(df, results, args)
+
+
+def report_ves_results(df, results, args):
+    """
+    Adds the VES rewards of run_sqls_parallel to the DataFrame and builds the summary,
+    writing both to args.output if set.
+    
+    Parameters:
+    df (pd.DataFrame): Evaluated DataFrame, with the same_row_count/same_column_count indicators
+    results (list): Per-query dicts with sql_idx and reward
+    args (Namespace): Output path and column names of ves_eval
+    
+    Returns:
+    tuple: (summary DataFrame, details DataFrame)
+    """
+    if 'index' in df.columns:
+        original_indexes = df['index'].tolist()
+    else:
+        original_indexes = df.index.tolist()
     results = sorted(results, key=lambda x: x["sql_idx"])
 
     # Add the VES results directly to the dataframe